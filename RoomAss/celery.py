@@ -22,6 +22,14 @@ app.conf.update(
             'task': 'catalog.tasks.delete_ended_events',  # Your task
             'schedule': crontab(hour=19, minute=53),  # Runs at midnight every day
         },
+        'refresh-room-days-every-midnight': {
+            'task': 'catalog.tasks.refresh_room_days_task',
+            'schedule': crontab(hour=0, minute=5),  # just after the date rolls over
+        },
+        'send-email-outbox-every-minute': {
+            'task': 'catalog.tasks.send_email_outbox',
+            'schedule': timedelta(minutes=1),
+        },
        
     },
 
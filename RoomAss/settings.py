@@ -53,6 +53,8 @@ INSTALLED_APPS = [
 ]
  
 MIDDLEWARE = [
+    # first, so the session and auth queries count too
+    'catalog.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -97,6 +99,25 @@ DATABASES = {
 }
 
 
+# Caches
+# 'catalog' holds the available_rooms results and room timelines (catalog/caching.py)
+# local memory is right for runserver, but it's per process, so with several workers in production
+# point it at something shared in .env, e.g.
+#   CATALOG_CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache
+#   CATALOG_CACHE_LOCATION=/var/tmp/roomass_cache
+# or DatabaseCache with a table name as the location (then run manage.py createcachetable)
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'catalog': {
+        'BACKEND': config('CATALOG_CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CATALOG_CACHE_LOCATION', default='catalog'),
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -150,3 +171,9 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 LOGIN_REDIRECT_URL = '/'
 
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+
+# Per view timing and query counts, see catalog/instrumentation.py
+# a request running the same query shape more than this many times is flagged as an N+1
+INSTRUMENTATION_REPEAT_THRESHOLD = 10
+# how often the summary line gets logged
+INSTRUMENTATION_LOG_SECONDS = 300
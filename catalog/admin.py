@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User
 
-from .models import Building, Section, Room, Person, CustomEvent
+from .models import Building, Section, Room, Person, CustomEvent, OutboxEmail, ArchivedBooking
 from .forms import CustomEventForm
 
 
@@ -64,4 +64,25 @@ class UserAdmin(BaseUserAdmin):
 
 # Re-register UserAdmin
 admin.site.unregister(User)
-admin.site.register(User, UserAdmin)
\ No newline at end of file
+admin.site.register(User, UserAdmin)
+
+
+# Queued emails, mostly here to see what failed and why
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ('recipient', 'subject', 'created_on', 'sent_on', 'attempts')
+    list_filter = ('sent_on',)
+    search_fields = ('recipient', 'subject')
+
+
+# Guest history, look don't touch
+@admin.register(ArchivedBooking)
+class ArchivedBookingAdmin(admin.ModelAdmin):
+    list_display = ('guest_name', 'host_name', 'room_name', 'start', 'end')
+    search_fields = ('guest_name', 'host_name', 'room_name')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,115 @@
+import random
+from functools import reduce
+from operator import or_
+
+from django.db.models import BooleanField, Case, Exists, ExpressionWrapper, IntegerField, OuterRef, Q, When
+from django.utils import timezone
+
+from catalog.intervals import CalendarIndex
+from catalog.models import CustomEvent, Room
+
+
+# Set based version of Room.is_available() + Room.get_last_available_date()
+# The front page used to ask every room individually (4ish queries a room),
+# this answers the same question for a whole batch of rooms with one event query
+#
+# rooms should already be a list/queryset with owner selected, the room query itself is the caller's business
+# returns a list of (room, last_available_date) in the same order as rooms
+def find_available_rooms(rooms, start_date, end_date, guest_type):
+
+    if timezone.is_naive(start_date):
+        start_date = timezone.make_aware(start_date, timezone.get_current_timezone())
+    if timezone.is_naive(end_date):
+        end_date = timezone.make_aware(end_date, timezone.get_current_timezone())
+
+    # offline rooms, rooms with no calendar and rooms whose owner won't take this guest are out before we touch events
+    candidates = [
+        room for room in rooms
+        if not room.is_offline
+        and room.calendar_id
+        and (not room.owner or int(guest_type) >= int(room.owner.preference))
+    ]
+    if not candidates:
+        return []
+
+    # Everything still going on at the start date, indexed per calendar (catalog/intervals.py)
+    indexes = CalendarIndex.for_calendars([room.calendar_id for room in candidates], after=start_date)
+
+    available = []
+    for room in candidates:
+        index = indexes.get(room.calendar_id)
+        if index is not None and room.is_available(start_date, end_date, index=index):
+            available.append((room, room.get_last_available_date(start_date, index=index)))
+
+    return available
+
+
+# Rooms that could take displaced bookings, for a batch of windows at once, in one query
+# windows is a list of (start_date, end_date, guest_type), one per displaced fragment
+# returns a list of candidate rooms per window, in the same order as windows
+#
+# a room fits a window if it's online, has a covering availability, no overlapping occupancy and an owner
+# who takes this guest type (same rules as Room.is_available, done as EXISTS subqueries, one set per window)
+# ranked same building, then same area, then anywhere else, shuffled within each rank
+# so the same room doesn't soak up every reassignment. rng is there so tests can pin the shuffle
+def reassignment_candidates(original_room, windows, rng=random):
+    if not windows:
+        return []
+    building = original_room.section.building
+
+    fits = {
+        f'fits_{i}': ExpressionWrapper(room_fits(start_date, end_date, guest_type), output_field=BooleanField())
+        for i, (start_date, end_date, guest_type) in enumerate(windows)
+    }
+    rooms = list(Room.objects.annotate(**fits).filter(
+        reduce(or_, (Q(**{name: True}) for name in fits)),
+        is_offline=False,
+        calendar__isnull=False,
+    ).exclude(
+        id=original_room.id,
+    ).annotate(
+        proximity=Case(
+            When(section__building_id=building.id, then=0),
+            When(section__building__area=building.area, then=1),
+            default=2,
+            output_field=IntegerField(),
+        ),
+    ).select_related('calendar', 'owner'))
+
+    return [
+        shuffle_within_ranks([room for room in rooms if getattr(room, name)], lambda room: room.proximity, rng)
+        for name in fits
+    ]
+
+
+# The rules for one window, as a filter on Room
+def room_fits(start_date, end_date, guest_type):
+    # unknown guest type gets the most careful treatment
+    guest_type = int(guest_type or CustomEvent.GuestType.STRANGER)
+
+    covering_availability = CustomEvent.objects.filter(
+        calendar_id=OuterRef('calendar_id'),
+        event_type='availability',
+        start__lte=start_date,
+        end__gte=end_date,
+    )
+    overlapping_occupancy = CustomEvent.objects.filter(
+        calendar_id=OuterRef('calendar_id'),
+        event_type='occupancy',
+        start__lt=end_date,
+        end__gt=start_date,
+    )
+    return Q(Exists(covering_availability), ~Exists(overlapping_occupancy), Q(owner__isnull=True) | Q(owner__preference__lte=guest_type))
+
+
+# rooms sorted by rank(room), shuffled among equal ranks
+def shuffle_within_ranks(rooms, rank, rng=random):
+    ranks = {}
+    for room in rooms:
+        ranks.setdefault(rank(room), []).append(room)
+
+    ranked = []
+    for key in sorted(ranks):
+        rng.shuffle(ranks[key])
+        ranked.extend(ranks[key])
+    return ranked
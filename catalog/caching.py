@@ -0,0 +1,158 @@
+import uuid
+from collections import Counter
+
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.utils import timezone
+
+
+# Results cached in the 'catalog' cache (settings.CACHES), kept honest by version tokens
+# every calendar has a token, and the signals (plus rebuild_room_days, for the bulk paths) give
+# it a new one whenever that room's events, the room itself or its owner's preference change.
+# There's also one token for the set of rooms as a whole (any room saved, added or removed, renumbered...)
+# which the bulk paths that skip Room.save (calendars.create_rooms, provisioning) bump themselves
+# and one for the people, for the lists of members the rooms pages offer
+#
+# A cached result remembers the tokens it was computed under and only counts while they all match,
+# so a change to one room invalidates exactly the results that looked at that room
+
+CACHE_ALIAS = 'catalog'
+ROOMS_KEY = 'catalog:version:rooms'
+PEOPLE_KEY = 'catalog:version:people'
+# belt and braces, nothing should live longer than this even if a bump was missed
+RESULT_TIMEOUT = 60 * 60
+
+# hits / misses per kind of result, per process (shown at /instrumentation/)
+counters = Counter()
+
+
+def cache():
+    return caches[CACHE_ALIAS]
+
+
+def version_key(calendar_id):
+    return f"catalog:version:calendar:{calendar_id}"
+
+
+def _set_tokens(keys):
+    token = uuid.uuid4().hex
+    cache().set_many({key: token for key in keys}, timeout=None)
+
+
+# New tokens now, and again once the transaction commits, so a request that read the old rows
+# between the two can't store them under the new token
+def _bump(keys):
+    keys = list(keys)
+    if not keys:
+        return
+    _set_tokens(keys)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: _set_tokens(keys))
+
+
+def bump_calendars(calendar_ids):
+    _bump({version_key(calendar_id) for calendar_id in calendar_ids if calendar_id})
+
+
+def bump_rooms():
+    _bump([ROOMS_KEY])
+
+
+def bump_people():
+    _bump([PEOPLE_KEY])
+
+
+# Current tokens for these keys, giving any that don't have one yet (or were evicted) a fresh one
+def current_tokens(keys):
+    tokens = cache().get_many(keys)
+    missing = [key for key in keys if key not in tokens]
+    if missing:
+        token = uuid.uuid4().hex
+        cache().set_many({key: token for key in missing}, timeout=None)
+        tokens.update({key: token for key in missing})
+    return tokens
+
+
+# The result under key, if every token it was stored with is still current
+def cached(kind, key):
+    entry = cache().get(key)
+    if entry is not None:
+        current = cache().get_many(list(entry['tokens']))
+        if all(current.get(token_key) == token for token_key, token in entry['tokens'].items()):
+            counters[f'{kind}_hits'] += 1
+            return entry['result']
+    counters[f'{kind}_misses'] += 1
+    return None
+
+
+def store(key, tokens, result, timeout=RESULT_TIMEOUT):
+    cache().set(key, {'tokens': tokens, 'result': result}, timeout)
+
+
+# available_rooms' search, cached by (start, end, guest_type)
+# compute() does the real work, rooms is the queryset it searches
+# the answer depends on every room, so it carries every calendar's token plus the rooms token
+def cached_available_rooms(rooms, start_date, end_date, guest_type, compute):
+    # today matters too, the nightly table and the defaults both roll over at midnight
+    key = f"catalog:available:{start_date:%Y-%m-%d}:{end_date:%Y-%m-%d}:{guest_type}:{timezone.localdate()}"
+    result = cached('available_rooms', key)
+    if result is not None:
+        return result
+
+    # tokens are read before computing, so a change part way through makes the entry stale, not wrong
+    calendar_ids = [calendar_id for calendar_id in rooms.values_list('calendar_id', flat=True) if calendar_id]
+    tokens = current_tokens([ROOMS_KEY] + [version_key(calendar_id) for calendar_id in calendar_ids])
+    result = list(compute())
+    store(key, tokens, result)
+    return result
+
+
+def timeline_key(calendar_id):
+    return f"catalog:timeline:{calendar_id}"
+
+
+# {calendar id: timeline} for my_room and rooms_master (loaders.room_timelines)
+# a timeline only depends on its own calendar's events, so each one carries just that calendar's token,
+# also handed back as timeline['version'] for the template fragments built from it (rooms_master.html)
+# load(calendar_ids) builds the ones that are missing or stale, all in one go
+def cached_timelines(calendar_ids, load):
+    calendar_ids = list(dict.fromkeys(calendar_ids))
+    found = cache().get_many([timeline_key(calendar_id) for calendar_id in calendar_ids] + [version_key(calendar_id) for calendar_id in calendar_ids])
+
+    timelines, stale = {}, []
+    for calendar_id in calendar_ids:
+        entry = found.get(timeline_key(calendar_id))
+        token = found.get(version_key(calendar_id))
+        if entry is not None and token is not None and entry['tokens'] == {version_key(calendar_id): token}:
+            timelines[calendar_id] = entry['result']
+        else:
+            stale.append(calendar_id)
+    counters['timeline_hits'] += len(timelines)
+    counters['timeline_misses'] += len(stale)
+
+    if stale:
+        # tokens first, as with the available_rooms results
+        tokens = current_tokens([version_key(calendar_id) for calendar_id in stale])
+        fresh = load(stale)
+        for calendar_id in stale:
+            fresh[calendar_id]['version'] = tokens[version_key(calendar_id)]
+        cache().set_many({
+            timeline_key(calendar_id): {'tokens': {version_key(calendar_id): tokens[version_key(calendar_id)]}, 'result': fresh[calendar_id]}
+            for calendar_id in stale
+        }, RESULT_TIMEOUT)
+        timelines.update(fresh)
+    return timelines
+
+
+# A list of (id, label) choices (choices.py), cached until any room or person changes
+# compute() builds the list, name keeps the lists apart
+def cached_choices(name, compute):
+    key = f"catalog:choices:{name}"
+    result = cached('choices', key)
+    if result is not None:
+        return result
+
+    tokens = current_tokens([ROOMS_KEY, PEOPLE_KEY])
+    result = list(compute())
+    store(key, tokens, result)
+    return result
@@ -0,0 +1,96 @@
+import re
+from datetime import datetime
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+from schedule.models import Calendar
+
+from catalog.caching import bump_rooms
+from catalog.models import CustomEvent, Room
+from catalog.room_days import rebuild_room_days
+from catalog.utils import bulk_create_custom_events
+
+
+# Every room gets a calendar of its own when it's created, this is the one place that happens
+# (the create_room_calendar signal for room.save(), create_rooms() for lots at once)
+# slugs are "room-<number>-calendar", with -1, -2... on the end when that's taken,
+# and rooms without an owner start out with a Permanent Availability
+
+
+def calendar_name(room):
+    if room.owner:
+        return f"{room.owner.name}'s Calendar"
+    return f"Room {room.number} in {room.section}"
+
+
+def base_slug(room):
+    return slugify(f"room-{room.number}-calendar")
+
+
+# Free slugs for a list of base slugs, in order, one query however many there are
+def allocate_slugs(bases):
+    if not bases:
+        return []
+
+    pattern = rf"^({'|'.join(re.escape(base) for base in set(bases))})(-[0-9]+)?$"
+    taken = set(Calendar.objects.filter(slug__regex=pattern).values_list('slug', flat=True))
+
+    slugs = []
+    for base in bases:
+        slug, num = base, 1
+        while slug in taken:
+            slug = f"{base}-{num}"
+            num += 1
+        taken.add(slug)
+        slugs.append(slug)
+    return slugs
+
+
+def permanent_availability(calendar_id, start=None):
+    never_date = timezone.make_aware(datetime(2999, 12, 31, 12, 0, 0), timezone.get_current_timezone())
+    return CustomEvent(calendar_id=calendar_id, event_type='availability', start=start or timezone.now(),
+                       end=never_date, title="Permanent Availability")
+
+
+# Rooms that are already saved but haven't been set up yet
+# rooms without a calendar get a new one, rooms created with one keep it and it just gets named
+# no room.save(), so no signals fire, RoomDayStatus is left to the caller
+def create_room_calendars(rooms):
+    rooms = list(rooms)
+    if not rooms:
+        return rooms
+
+    with transaction.atomic():
+        new = [room for room in rooms if room.calendar_id is None]
+        given = [room for room in rooms if room.calendar_id is not None]
+        slugs = allocate_slugs([base_slug(room) for room in new])
+        calendars = Calendar.objects.bulk_create([
+            Calendar(name=calendar_name(room), slug=slug)
+            for room, slug in zip(new, slugs)
+        ])
+        for room, calendar in zip(new, calendars):
+            room.calendar = calendar
+        Room.objects.bulk_update(new, ['calendar'])
+
+        for room in given:
+            room.calendar.name = calendar_name(room)
+        Calendar.objects.bulk_update([room.calendar for room in given], ['name'])
+
+        now = timezone.now()
+        bulk_create_custom_events([permanent_availability(room.calendar_id, now) for room in rooms if not room.owner_id])
+    return rooms
+
+
+# Bulk variant of Room.objects.create(), for imports and the like
+# a handful of queries for the whole lot instead of a dozen per room
+def create_rooms(rooms):
+    with transaction.atomic():
+        rooms = Room.objects.bulk_create(rooms)
+        create_room_calendars(rooms)
+        for room in rooms:
+            room._snapshot_tracked_fields()
+        rebuild_room_days(rooms)
+        # no post_save for bulk_create, so nothing else tells the cached results there are new rooms
+        bump_rooms()
+    return rooms
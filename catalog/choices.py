@@ -0,0 +1,20 @@
+from catalog.caching import cached_choices
+from catalog.models import Person
+
+
+# The member and room lists rooms_master offers, built once and cached (caching.cached_choices)
+# instead of a query per page, plus a building lookup per room for the labels
+
+
+# (id, label) choices for a ModelChoiceField, from its queryset and label_from_instance
+# give the queryset whatever select_related its labels need
+def field_choices(name, field):
+    choices = cached_choices(name, lambda: [(obj.pk, field.label_from_instance(obj)) for obj in field.queryset])
+    if field.empty_label is not None:
+        choices = [('', field.empty_label)] + choices
+    return choices
+
+
+# (id, name) for everyone without a room, for the assign owner dropdowns
+def roomless_members():
+    return cached_choices('roomless_members', lambda: Person.objects.filter(room__isnull=True).values_list('id', 'name'))
@@ -0,0 +1,97 @@
+import time
+
+from django.db import transaction
+from django.utils import timezone
+
+from catalog.models import ArchivedBooking, CustomEvent
+from catalog.room_days import deferred_room_days
+
+
+# Clearing out events that are over
+# Used to be one count() and one delete() of everything, which holds SQLite's write lock for the whole
+# cascade through the schedule tables. Now it goes in primary key order, a batch per transaction,
+# so other requests get the database between batches and a run that stops part way can pick up where it left off
+#
+# Bookings aren't just dropped, each batch copies its occupancy events into ArchivedBooking
+# in the same transaction as the delete, so guest history survives and the live table stays small
+
+BATCH_SIZE = 500
+MIN_BATCH_SIZE = 50
+MAX_BATCH_SIZE = 2000
+# aim for batches quicker than this, the batch size adapts to hit it
+BATCH_SECONDS = 0.5
+
+
+# Deletes events with end < cutoff (default now), starting after primary key after_pk
+# stops when there's nothing left, or once max_seconds have gone by (None for no limit)
+# progress, if given, is called with the report after every batch
+# archive=False skips the ArchivedBooking copy
+#
+# returns a report: {'deleted', 'archived', 'batches', 'last_pk', 'finished', 'cutoff'}
+# pass last_pk back in as after_pk to carry on from an unfinished run
+def delete_ended_events(cutoff=None, after_pk=0, batch_size=BATCH_SIZE, batch_seconds=BATCH_SECONDS, max_seconds=None, progress=None, archive=True):
+    cutoff = cutoff or timezone.now()
+    ended = CustomEvent.objects.filter(end__lt=cutoff).order_by('pk')
+
+    report = {'deleted': 0, 'archived': 0, 'batches': 0, 'last_pk': after_pk, 'finished': False, 'cutoff': cutoff}
+    started = time.monotonic()
+
+    while True:
+        pks = list(ended.filter(pk__gt=report['last_pk']).values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            report['finished'] = True
+            break
+
+        batch_started = time.monotonic()
+        # bookings that ended since yesterday are still in RoomDayStatus, each of their rooms is
+        # rebuilt once after the batch commits rather than once per event inside it
+        with deferred_room_days(), transaction.atomic():
+            if archive:
+                report['archived'] += len(archive_bookings(pks))
+            _, deleted = CustomEvent.objects.filter(pk__in=pks).delete()
+        elapsed = time.monotonic() - batch_started
+
+        report['deleted'] += deleted.get(CustomEvent._meta.label, 0)
+        report['batches'] += 1
+        report['last_pk'] = pks[-1]
+        if progress:
+            progress(report)
+
+        # keep each write lock short: halve after a slow batch, double after a quick one
+        if elapsed > batch_seconds:
+            batch_size = max(MIN_BATCH_SIZE, batch_size // 2)
+        elif elapsed < batch_seconds / 4:
+            batch_size = min(MAX_BATCH_SIZE, batch_size * 2)
+
+        if max_seconds is not None and time.monotonic() - started >= max_seconds:
+            break
+
+    return report
+
+
+# Copies the occupancy events among pks into ArchivedBooking, one select and one insert
+def archive_bookings(pks):
+    bookings = CustomEvent.objects.filter(pk__in=pks, event_type='occupancy').select_related(
+        'calendar__room__section__building',
+        'calendar__room__owner',
+        'creator',
+    )
+
+    archived = []
+    for booking in bookings:
+        room = booking.calendar.room if booking.calendar and hasattr(booking.calendar, 'room') else None
+        archived.append(ArchivedBooking(
+            event_id=booking.pk,
+            room=room,
+            room_name=str(room) if room else "",
+            room_owner=room.owner.name if room and room.owner else "",
+            host=booking.creator,
+            host_name=str(booking.creator) if booking.creator else "",
+            guest_name=booking.guest_name,
+            guest_type=booking.guest_type,
+            title=booking.title,
+            start=booking.start,
+            end=booking.end,
+            created_on=booking.created_on,
+        ))
+    return ArchivedBooking.objects.bulk_create(archived)
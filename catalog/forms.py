@@ -2,6 +2,7 @@ from django import forms
 from django.core.validators import MinLengthValidator, MaxLengthValidator
 import bleach
 from .models import Person, CustomEvent, Room, Section
+from .choices import field_choices
 from django.contrib.auth.models import User
 from datetime import datetime, timedelta
 from django.core.exceptions import ValidationError
@@ -241,15 +242,23 @@ class CustomEventForm(forms.ModelForm):
 
 
 ### Rooms Master Selection Forms####
-class PersonSelectForm(forms.Form):
+
+# The options come from the cached lists in choices.py, the querysets are only used to validate a choice
+class CachedChoicesForm(forms.Form):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for name, field in self.fields.items():
+            field.choices = field_choices(f"{type(self).__name__}.{name}", field)
+
+class PersonSelectForm(CachedChoicesForm):
     person = forms.ModelChoiceField(
         queryset=Person.objects.filter(room__is_offline=False),
         label="Select Room by Owner"
     )
-class RoomSelectForm(forms.Form):
+class RoomSelectForm(CachedChoicesForm):
     room = forms.ModelChoiceField(
-        queryset=Room.objects.filter(owner__isnull=True, is_offline=False),
+        queryset=Room.objects.filter(owner__isnull=True, is_offline=False).select_related('section__building'),
           label="Select Room without Owner")
 
-class SectionSelectForm(forms.Form):
-    section = forms.ModelChoiceField(queryset=Section.objects.all(), label = "Select Rooms by Section")
\ No newline at end of file
+class SectionSelectForm(CachedChoicesForm):
+    section = forms.ModelChoiceField(queryset=Section.objects.select_related('building'), label = "Select Rooms by Section")
\ No newline at end of file
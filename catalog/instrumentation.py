@@ -0,0 +1,159 @@
+import logging
+import re
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+
+
+# Per view timings and query counts, kept in memory by InstrumentationMiddleware
+# every request records wall time, how many SQL queries it ran and how long they took
+# (via connection.execute_wrapper, so nothing else has to change), and gets flagged as an N+1
+# when the same query shape runs more than INSTRUMENTATION_REPEAT_THRESHOLD times
+#
+# The totals are per process: read them at /instrumentation/ (staff only), a summary line
+# also goes to the catalog.instrumentation logger every INSTRUMENTATION_LOG_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# defaults, settings.INSTRUMENTATION_REPEAT_THRESHOLD / INSTRUMENTATION_LOG_SECONDS win
+REPEAT_THRESHOLD = 10
+LOG_SECONDS = 300
+# the shapes kept per view for the report, most repeated first
+SHAPES_KEPT = 5
+
+# "IN (%s, %s, %s)" is the same query whatever the list length, and literals don't make a new shape
+IN_LIST = re.compile(r"\((?:\s*%s\s*,)*\s*%s\s*\)")
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+
+def query_shape(sql):
+    return LITERALS.sub('?', IN_LIST.sub('(...)', sql))
+
+
+# The execute_wrapper for one request
+class QueryRecorder:
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+            self.shapes[query_shape(sql)] += 1
+
+    def repeated(self, threshold=None):
+        if threshold is None:
+            threshold = getattr(settings, 'INSTRUMENTATION_REPEAT_THRESHOLD', REPEAT_THRESHOLD)
+        return {shape: count for shape, count in self.shapes.most_common() if count > threshold}
+
+
+class ViewStats:
+
+    def __init__(self):
+        self.requests = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.queries = 0
+        self.max_queries = 0
+        self.sql_seconds = 0.0
+        self.n_plus_one = 0
+        self.repeated = Counter()
+
+    def add(self, seconds, recorder, repeated):
+        self.requests += 1
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.queries += recorder.count
+        self.max_queries = max(self.max_queries, recorder.count)
+        self.sql_seconds += recorder.seconds
+        if repeated:
+            self.n_plus_one += 1
+            for shape, count in repeated.items():
+                self.repeated[shape] = max(self.repeated[shape], count)
+
+    def as_dict(self):
+        return {
+            'requests': self.requests,
+            'avg_ms': round(self.seconds / self.requests * 1000, 2),
+            'max_ms': round(self.max_seconds * 1000, 2),
+            'avg_queries': round(self.queries / self.requests, 1),
+            'max_queries': self.max_queries,
+            'avg_sql_ms': round(self.sql_seconds / self.requests * 1000, 2),
+            'n_plus_one_requests': self.n_plus_one,
+            'repeated_queries': [
+                {'sql': shape, 'max_count': count}
+                for shape, count in self.repeated.most_common(SHAPES_KEPT)
+            ],
+        }
+
+
+_lock = threading.Lock()
+_stats = {}
+_last_logged = time.monotonic()
+
+
+def record(view, seconds, recorder):
+    repeated = recorder.repeated()
+    if repeated:
+        worst, count = next(iter(repeated.items()))
+        logger.warning("Possible N+1 in %s: %d queries, one shape %d times: %s", view, recorder.count, count, worst[:200])
+
+    with _lock:
+        _stats.setdefault(view, ViewStats()).add(seconds, recorder, repeated)
+    maybe_log()
+
+
+# {view name: stats dict}, slowest total first
+def snapshot():
+    with _lock:
+        views = sorted(_stats.items(), key=lambda item: item[1].seconds, reverse=True)
+        return {view: stats.as_dict() for view, stats in views}
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+
+
+def maybe_log(now=None):
+    global _last_logged
+    now = time.monotonic() if now is None else now
+    with _lock:
+        if now - _last_logged < getattr(settings, 'INSTRUMENTATION_LOG_SECONDS', LOG_SECONDS) or not _stats:
+            return
+        _last_logged = now
+        views = sorted(_stats.items(), key=lambda item: item[1].seconds, reverse=True)
+        summary = "; ".join(
+            f"{view} {stats.requests}x avg {stats.seconds / stats.requests * 1000:.0f}ms "
+            f"{stats.queries / stats.requests:.1f}q" + (f" n+1 {stats.n_plus_one}x" if stats.n_plus_one else "")
+            for view, stats in views[:10]
+        )
+    logger.info("View timings: %s", summary)
+
+
+class InstrumentationMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        # not per path, or every 404 probe would get its own entry
+        view = match.view_name if match else '<unresolved>'
+        record(view, elapsed, recorder)
+        return response
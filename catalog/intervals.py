@@ -0,0 +1,138 @@
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+
+from catalog.models import CustomEvent
+
+
+# Sorted, read-only view over a set of events (anything with .start and .end)
+# Built once, then overlap / containment / next-event questions are bisects instead of queries
+#
+# starts are sorted, and max_ends[i] is the latest end among events[0..i]
+# that running max is never decreasing so it can be bisected too, which is what makes
+# "does anything cover / overlap this range" O(log n)
+class IntervalIndex:
+
+    def __init__(self, events):
+        # stable on start only, so events with the same start keep the order they came in (usually the query's)
+        self.events = sorted(events, key=lambda event: event.start)
+        self.starts = [event.start for event in self.events]
+        self.max_ends = []
+        for event in self.events:
+            if self.max_ends and self.max_ends[-1] > event.end:
+                self.max_ends.append(self.max_ends[-1])
+            else:
+                self.max_ends.append(event.end)
+
+    def __iter__(self):
+        return iter(self.events)
+
+    def __len__(self):
+        return len(self.events)
+
+    def __bool__(self):
+        return bool(self.events)
+
+    # Is there one event with start <= start_date and end >= end_date
+    def covers(self, start_date, end_date):
+        i = bisect_right(self.starts, start_date)
+        return i > 0 and self.max_ends[i - 1] >= end_date
+
+    # Is there any event with start < end_date and end > start_date
+    def overlaps(self, start_date, end_date):
+        i = bisect_left(self.starts, end_date)
+        return i > 0 and self.max_ends[i - 1] > start_date
+
+    # Events with start <= point <= end, in start order
+    def containing(self, point):
+        i = bisect_right(self.starts, point)
+        # nothing before j reaches the point, so only look at j..i
+        j = bisect_left(self.max_ends, point, 0, i)
+        return [event for event in self.events[j:i] if event.end >= point]
+
+    # Events with start_date <= start and end <= end_date, in start order
+    def within(self, start_date, end_date):
+        i = bisect_left(self.starts, start_date)
+        j = bisect_right(self.starts, end_date)
+        return [event for event in self.events[i:j] if event.end <= end_date]
+
+    # First event starting at or after point (and before `before` if given), or None
+    def next_starting(self, point, before=None):
+        i = bisect_left(self.starts, point)
+        if i == len(self.events):
+            return None
+        event = self.events[i]
+        if before is not None and event.start >= before:
+            return None
+        return event
+
+    # Stretches of [start_date, end_date) that no event touches, as (start, end) tuples
+    def gaps(self, start_date, end_date):
+        i = bisect_left(self.starts, end_date)
+        j = bisect_right(self.max_ends, start_date, 0, i)
+
+        gaps = []
+        edge = start_date
+        for event in self.events[j:i]:
+            if event.end <= start_date:
+                continue
+            if event.start > edge:
+                gaps.append((edge, event.start))
+            if event.end > edge:
+                edge = event.end
+        if edge < end_date:
+            gaps.append((edge, end_date))
+        return gaps
+
+
+# Availability + occupancy indexes for a single calendar
+# this is what Room.is_available / get_last_available_date take as `index=`
+class CalendarIndex:
+
+    def __init__(self, availability_events=(), occupancy_events=()):
+        self.availability = IntervalIndex(availability_events)
+        self.occupancy = IntervalIndex(occupancy_events)
+
+    # One query for one calendar
+    @classmethod
+    def for_calendar(cls, calendar):
+        return cls.for_calendars([calendar.id]).get(calendar.id, cls())
+
+    # One query for any number of calendars, returns {calendar_id: CalendarIndex}
+    # `after` drops events that are already over by then (handy for anything date driven)
+    @classmethod
+    def for_calendars(cls, calendar_ids, after=None):
+        events = CustomEvent.objects.filter(
+            calendar_id__in=list(calendar_ids),
+            event_type__in=['availability', 'occupancy'],
+        ).only('calendar_id', 'event_type', 'start', 'end', 'created_on')
+        if after is not None:
+            events = events.filter(end__gte=after)
+
+        grouped = defaultdict(lambda: ([], []))
+        for event in events:
+            availability, occupancy = grouped[event.calendar_id]
+            if event.event_type == 'availability':
+                availability.append(event)
+            else:
+                occupancy.append(event)
+
+        return {calendar_id: cls(availability, occupancy) for calendar_id, (availability, occupancy) in grouped.items()}
+
+    # Same rules as Room.is_available, minus the room level checks
+    def is_available(self, start_date, end_date):
+        if self.occupancy.overlaps(start_date, end_date):
+            return False
+        return self.availability.covers(start_date, end_date)
+
+    # Same rules as Room.get_last_available_date
+    def last_available_date(self, start_date):
+        containing = self.availability.containing(start_date)
+        if not containing:
+            return None
+        # oldest one wins, same as the order_by('created_on') in the query version
+        current_availability = min(containing, key=lambda event: event.created_on)
+
+        next_occupancy = self.occupancy.next_starting(start_date, before=current_availability.end)
+        if next_occupancy:
+            return min(current_availability.end, next_occupancy.start)
+        return current_availability.end
@@ -0,0 +1,140 @@
+from collections import defaultdict
+
+from django.db.models import Q
+
+from catalog.caching import cached_timelines
+from catalog.intervals import CalendarIndex
+from catalog.models import CustomEvent, Room
+from catalog.utils import process_occupancy_events
+
+
+# Loaders gather everything a room page needs up front in a fixed number of queries,
+# instead of the templates and views pulling owners, calendars and events room by room
+
+
+# Rooms with everything the room cards touch selected
+# the events come separately, from room_timelines()
+def rooms_for_display():
+    return Room.objects.select_related('owner', 'calendar', 'section__building')
+
+
+# {calendar id: timeline} for these rooms, a timeline being the availability events and the
+# processed Booked / Vacant blocks (process_occupancy_events)
+# timelines are cached per calendar until that calendar's events change (caching.py), so only
+# the rooms that changed since they were last shown cost anything: one query for all of them
+def room_timelines(rooms):
+    return cached_timelines([room.calendar_id for room in rooms if room.calendar_id], load_timelines)
+
+
+def load_timelines(calendar_ids):
+    availability_events = defaultdict(list)
+    occupancy_events = defaultdict(list)
+    events = CustomEvent.objects.filter(calendar_id__in=calendar_ids, event_type__in=['availability', 'occupancy']).order_by('start')
+    for event in events:
+        if event.event_type == 'availability':
+            availability_events[event.calendar_id].append(event)
+        else:
+            occupancy_events[event.calendar_id].append(event)
+
+    return {
+        calendar_id: {
+            'availability_events': availability_events[calendar_id],
+            # Processing so we can display booked AND vacant timeblocks within an availability
+            'occupancy_events_and_vacancies': process_occupancy_events(availability_events[calendar_id], occupancy_events[calendar_id]),
+        }
+        for calendar_id in calendar_ids
+    }
+
+
+# The per-room dict the room pages render, from the room's timeline (no queries)
+def room_info(room, timeline):
+    availability_events = timeline['availability_events']
+
+    room_title = str(room)
+    if room.owner:
+        room_title = str(room.owner) + "'s Room"
+
+    return {
+        'availability_events': availability_events,
+        'occupancy_events_and_vacancies': timeline['occupancy_events_and_vacancies'],
+        'room_image_url': room.image.url if room.image else '',
+        'room_name': str(room),
+        'events_exist': bool(availability_events),
+        'room_id': room.id,
+        'owner_id': room.owner.id if room.owner else None,
+        'room_title': room_title,
+        # the calendar's version token, for fragment cache keys
+        'version': timeline['version'],
+    }
+
+
+# Every room in a section with its timeline, {room: room_info}
+# 2 queries at most: rooms (with owner, calendar, building), then events for the rooms whose timeline isn't cached
+def load_section_rooms(section):
+    rooms = [room for room in rooms_for_display().filter(section=section) if room.calendar]
+    timelines = room_timelines(rooms)
+    return {room: room_info(room, timelines[room.calendar_id]) for room in rooms}
+
+
+# A room plus the rooms of its owner's children, for my_room and rooms_master by room
+# give it the person (my_room) or the room id (rooms_master)
+# 2 queries at most however many children: rooms, then events for timelines that aren't cached
+#
+# returns None when there's no such room, otherwise a dict of
+# room, room_info, children (child Persons with rooms) and children_info ({child: room_info})
+def load_household(person=None, room_id=None):
+    if person is not None:
+        rooms = rooms_for_display().filter(Q(owner=person) | Q(owner__parent=person))
+        is_main_room = lambda room: room.owner_id == person.id
+    else:
+        rooms = rooms_for_display().filter(Q(id=room_id) | Q(owner__parent__room__id=room_id))
+        is_main_room = lambda room: room.id == room_id
+
+    rooms = list(rooms.order_by('owner__id'))
+    timelines = room_timelines(rooms)
+    no_events = {'availability_events': [], 'occupancy_events_and_vacancies': [], 'version': None}
+
+    household = None
+    children = []
+    children_info = {}
+    for room in rooms:
+        if is_main_room(room):
+            household = {'room': room, 'room_info': room_info(room, timelines.get(room.calendar_id, no_events))}
+        else:
+            children.append(room.owner)
+            if room.calendar:
+                children_info[room.owner] = room_info(room, timelines[room.calendar_id])
+
+    if household is not None:
+        household.update({'children': children, 'children_info': children_info})
+    return household
+
+
+# Bookings with room, owner, building and host joined in, for all_guests / my_guests
+# bookings on a calendar with no room (left over from a deleted room) have nowhere to show, so they're left out
+def occupancy_events_for_display():
+    return CustomEvent.objects.filter(
+        event_type='occupancy',
+        calendar__room__isnull=False,
+    ).select_related(
+        'calendar__room__owner',
+        'calendar__room__section__building',
+        'creator',
+    ).order_by('start')
+
+
+# {event id: room.get_last_available_date(event.end)} for a batch of bookings
+# one query for all of them instead of two per booking
+def last_available_dates(events):
+    events = list(events)
+    if not events:
+        return {}
+
+    indexes = CalendarIndex.for_calendars(
+        {event.calendar_id for event in events},
+        after=min(event.end for event in events),
+    )
+    return {
+        event.id: event.calendar.room.get_last_available_date(event.end, index=indexes.get(event.calendar_id, CalendarIndex()))
+        for event in events
+    }
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.provisioning import import_rooms, read_rows
+
+
+# Provisions buildings, sections, rooms and owners from a CSV or JSON file, see catalog/provisioning.py
+# safe to re-run, what's already there is skipped
+class Command(BaseCommand):
+    help = "Import buildings, sections, rooms, owners and preferences from a CSV or JSON file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV (building,area,section,room,owner,preference,offline) or nested JSON")
+        parser.add_argument('--format', choices=['csv', 'json'], help="Defaults to the file's extension")
+
+    def handle(self, *args, **options):
+        try:
+            report = import_rooms(read_rows(options['path'], options['format']))
+        except (OSError, ValueError) as error:
+            raise CommandError(str(error))
+
+        self.stdout.write(
+            f"{report['buildings']} buildings, {report['sections']} sections, {report['rooms']} rooms, "
+            f"{report['owners']} new owners ({report['preferences']} preferences updated), {report['skipped']} rooms already there"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report['rows']} rows in {report['seconds']:.2f}s ({report['rows_per_second']:.0f} rows/s)"
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from catalog.room_days import refresh_room_days
+
+
+# Fills / refreshes the RoomDayStatus table for every room
+# run it once after migrating, after that the signals and the daily task keep it current
+class Command(BaseCommand):
+    help = "Rebuild the per night availability table (RoomDayStatus) for every room"
+
+    def handle(self, *args, **options):
+        count = refresh_room_days()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt nightly availability for {count} rooms"))
@@ -0,0 +1,30 @@
+from django.db import migrations, models
+
+
+# Composite indexes for the hot CustomEvent filters
+# calendar/start/end are columns of schedule_event (the django-scheduler parent table),
+# Django can't put a model index on another app's table so those two are plain SQL
+# creator_id and end already have single column indexes from django-scheduler
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0028_alter_room_calendar'),
+        ('schedule', '0014_use_autofields_for_pk'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customevent',
+            index=models.Index(fields=['event_type', 'event_ptr'], name='customevent_type_ptr_idx'),
+        ),
+        # is_available / get_last_available_date / my_room / rooms_master: calendar = X and start <= / >= Y
+        migrations.RunSQL(
+            sql='CREATE INDEX schedule_event_cal_start_end_idx ON schedule_event (calendar_id, start, "end");',
+            reverse_sql='DROP INDEX schedule_event_cal_start_end_idx;',
+        ),
+        # overlap and "still going on" checks: calendar = X and end > Y
+        migrations.RunSQL(
+            sql='CREATE INDEX schedule_event_cal_end_idx ON schedule_event (calendar_id, "end");',
+            reverse_sql='DROP INDEX schedule_event_cal_end_idx;',
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Fill the table for the rooms already there, so the front page can use it straight away
+# (the app's own models, the rebuild needs CalendarIndex and friends, and none of the tables it reads change after this)
+def backfill_room_days(apps, schema_editor):
+    from catalog.room_days import refresh_room_days
+    refresh_room_days()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0029_customevent_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomDayStatus',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.IntegerField(choices=[(1, 'Available'), (2, 'Booked'), (3, 'Unavailable'), (4, 'Offline')])),
+                ('min_guest_type', models.IntegerField(choices=[(1, 'Anyone can stay here'), (2, 'Only people well known to TO can stay here'), (3, 'Only TO members can stay here')], default=1)),
+                ('available_until', models.DateTimeField(blank=True, null=True)),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='day_statuses', to='catalog.room')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'day', 'min_guest_type'], name='roomdaystatus_search_idx')],
+                'constraints': [models.UniqueConstraint(fields=('room', 'day'), name='roomdaystatus_room_day_unique')],
+            },
+        ),
+        migrations.RunPython(backfill_room_days, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:29
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0031_outboxemail'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedBooking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.IntegerField()),
+                ('room_name', models.CharField(blank=True, max_length=100)),
+                ('room_owner', models.CharField(blank=True, max_length=30)),
+                ('host_name', models.CharField(blank=True, max_length=150)),
+                ('guest_name', models.CharField(blank=True, max_length=20, null=True)),
+                ('guest_type', models.IntegerField(blank=True, choices=[(1, 'Stranger'), (2, 'Known'), (3, 'Member')], null=True)),
+                ('title', models.CharField(blank=True, max_length=255)),
+                ('start', models.DateTimeField()),
+                ('end', models.DateTimeField()),
+                ('created_on', models.DateTimeField(blank=True, null=True)),
+                ('archived_on', models.DateTimeField(auto_now_add=True)),
+                ('host', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_bookings', to=settings.AUTH_USER_MODEL)),
+                ('room', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_bookings', to='catalog.room')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['start'], name='archivedbooking_start_idx')],
+            },
+        ),
+    ]
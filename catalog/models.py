@@ -1,7 +1,7 @@
 from datetime import datetime
 
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import models, transaction
 from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.utils import timezone
@@ -38,14 +38,52 @@ class Person(models.Model):
         super().save(*args, **kwargs)
 
 
+# Remembers the tracked_fields values as they were loaded (or last saved),
+# so save() and the signals can tell what changed without fetching the row again
+# fields that were deferred when loading count as changed, to be on the safe side
+class TracksFieldChanges:
+    tracked_fields = ()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._snapshot_tracked_fields()
+
+    def _snapshot_tracked_fields(self):
+        self._loaded_values = {}
+        for name in self.tracked_fields:
+            attname = self._meta.get_field(name).attname
+            if attname in self.__dict__:
+                self._loaded_values[attname] = self.__dict__[attname]
+
+    def has_changed(self, *names):
+        if self._state.adding:
+            return True
+        for name in names:
+            attname = self._meta.get_field(name).attname
+            if attname not in self._loaded_values or self.__dict__.get(attname) != self._loaded_values[attname]:
+                return True
+        return False
+
+    # post_save receivers still see the old values, the snapshot moves on once they're done
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._snapshot_tracked_fields()
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._snapshot_tracked_fields()
+
+
 # Buildings that will have sections which will have rooms
 # area might be best as not a CharField but here we are
 # area currently divides buildings into "courtyard" and "not_courtyard"
 # this is used in auto reassign to try and place people near the orginal room
 #
 # Also, toggling is_offline (admin page) on the building will domino through sections and rooms
-# this is handled with signals, below the models code
-class Building(models.Model):
+# this is handled with signals (signals.py), in bulk by catalog/offline.py
+class Building(TracksFieldChanges, models.Model):
+  tracked_fields = ('is_offline',)
+
   name = models.CharField(max_length = 30)
   is_offline = models.BooleanField(default=False)
   area = models.CharField(max_length = 30)
@@ -56,7 +94,9 @@ class Building(models.Model):
 
 # Sections are floors, wings, pocket dimensions within a building
 # sections directly contain rooms
-class Section(models.Model):
+class Section(TracksFieldChanges, models.Model):
+  tracked_fields = ('is_offline',)
+
   building = models.ForeignKey(Building, on_delete=models.CASCADE, related_name='sections')
   name = models.CharField(max_length=30)
   is_offline = models.BooleanField(default=False)
@@ -66,27 +106,31 @@ class Section(models.Model):
     return f"{self.building.name} / {self.name}"
   
   def save(self, *args, **kwargs):
-        # Check if is_offline has changed
-        if self.pk:  # This ensures we are updating an existing instance
-            previous = Section.objects.get(pk=self.pk)
-            if (previous.is_offline != self.is_offline) and self.is_offline:
-              self.delete_availability_events()       
-        super().save(*args, **kwargs)  # Call the original save method
+        # Check if is_offline has changed (TracksFieldChanges, no need to fetch the old row)
+        if not (self.pk and self.has_changed('is_offline')):
+              return super().save(*args, **kwargs)  # Call the original save method
+
+        # the availability delete and the room cascade (set_rooms_offline) in one transaction,
+        # with RoomDayStatus rebuilt once per room at the end rather than once per deleted event
+        from catalog.room_days import deferred_room_days  # room_days imports this module
+        with transaction.atomic(), deferred_room_days():
+              if self.is_offline:
+                    self.delete_availability_events()
+              super().save(*args, **kwargs)
       
+  # one delete for every room in the section
   def delete_availability_events(self):
-      rooms = self.rooms.all()
-
-      for room in rooms:
-        calendar = room.calendar
-        if calendar:
-            CustomEvent.objects.filter(calendar=calendar, event_type='availability').delete()
+      CustomEvent.objects.filter(calendar__room__section=self, event_type='availability').delete()
             
 
             
       
 
 # Rooms where people stay
-class Room(models.Model):
+class Room(TracksFieldChanges, models.Model):
+    # what handle_room_calendar and the RoomDayStatus signals care about
+    tracked_fields = ('owner', 'calendar', 'is_offline')
+
     section = models.ForeignKey(Section, on_delete=models.CASCADE, related_name='rooms')
     number = models.IntegerField()
     calendar = models.OneToOneField(Calendar, on_delete=models.SET_NULL, null=True, blank=True, related_name='room')
@@ -98,14 +142,16 @@ class Room(models.Model):
     def __str__(self):
         return f"{self.section.building.name} / {self.section.name} / {self.number}"
 
-    def is_available(self, start_date, end_date):
+    # index is an optional prebuilt catalog.intervals.CalendarIndex for this room's calendar
+    # pass one in when asking lots of questions about the same room, otherwise this goes to the database
+    def is_available(self, start_date, end_date, index=None):
         if not isinstance(start_date, datetime) or not isinstance(end_date, datetime):
             raise ValueError("start_date and end_date must be valid datetime objects.")       
         
         if self.is_offline:
             return False
         
-        if not self.calendar:
+        if not self.calendar_id:
             return False
 
         # Ensure dates are timezone aware
@@ -113,9 +159,12 @@ class Room(models.Model):
             start_date = timezone.make_aware(start_date, timezone.get_current_timezone())
         if timezone.is_naive(end_date):
             end_date = timezone.make_aware(end_date, timezone.get_current_timezone())
+
+        if index is not None:
+            return index.is_available(start_date, end_date)
       
         occupancy_events_exist = CustomEvent.objects.filter(
-            calendar=self.calendar,
+            calendar_id=self.calendar_id,
             event_type='occupancy',
             start__lt=end_date,
             end__gt=start_date
@@ -125,7 +174,7 @@ class Room(models.Model):
             return False
 
         availability_events = CustomEvent.objects.filter(
-            calendar=self.calendar,
+            calendar_id=self.calendar_id,
             event_type='availability',
             start__lte=start_date,
             end__gte=end_date
@@ -134,19 +183,22 @@ class Room(models.Model):
         # Check for available and not occupied
         return availability_events.exists()
   
-    def get_last_available_date(self, start_date):
+    def get_last_available_date(self, start_date, index=None):
         if not isinstance(start_date, datetime):
             raise ValueError("start_date must be valid datetime object.")       
         
-        if not self.calendar:
+        if not self.calendar_id:
             return None
 
         if timezone.is_naive(start_date):
             start_date = timezone.make_aware(start_date, timezone.get_current_timezone())
 
+        if index is not None:
+            return index.last_available_date(start_date)
+
         # Fetch current availability event
         current_availability = CustomEvent.objects.filter(
-            calendar=self.calendar,
+            calendar_id=self.calendar_id,
             event_type='availability',
             start__lte=start_date,
             end__gte=start_date # there should only be one event to grab here
@@ -157,7 +209,7 @@ class Room(models.Model):
 
         # Fetch next occupancy event within the availability window
         next_occupancy = CustomEvent.objects.filter(
-            calendar=self.calendar,
+            calendar_id=self.calendar_id,
             event_type='occupancy',
             start__gte=start_date,
             start__lt=current_availability.end
@@ -190,6 +242,14 @@ class CustomEvent(Event):
     )
     guest_name = models.CharField(max_length=20, blank = True , null=True)
     event_type = models.CharField(max_length=20, choices=EVENT_TYPES)
+
+    # calendar, start, end and creator live on the parent schedule_event table (multi-table inheritance)
+    # so only event_type can be indexed from here, the composite calendar/start/end indexes on the
+    # parent table are created with raw SQL in migration 0029
+    class Meta:
+        indexes = [
+            models.Index(fields=['event_type', 'event_ptr'], name='customevent_type_ptr_idx'),
+        ]
     
     def save(self, *args, **kwargs):
         # print("Custom event is saving...")
@@ -200,7 +260,89 @@ class CustomEvent(Event):
             self.end = timezone.make_aware(self.end, timezone.get_current_timezone())
         # print(f"Saving CustomEvent: {self.title}")
         super(CustomEvent, self).save(*args, **kwargs)
-    
+
+
+# One row per room per night inside the booking horizon (the 90 days DateRangeForm allows)
+# "night of day" means the stay from day 23:59 to the next day 11:59, the same probe available_rooms uses
+# This is derived data, CustomEvent is still the source of truth. Rows are rebuilt by the signals in
+# catalog/signals.py and rolled forward daily, see catalog/room_days.py
+class RoomDayStatus(models.Model):
+
+    class Status(models.IntegerChoices):
+        AVAILABLE = 1, 'Available'
+        BOOKED = 2, 'Booked'
+        UNAVAILABLE = 3, 'Unavailable'  # no availability covering the night
+        OFFLINE = 4, 'Offline'
+
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name='day_statuses')
+    day = models.DateField()
+    status = models.IntegerField(choices=Status.choices)
+    # lowest guest type the owner accepts, Person.Preference values (ownerless rooms take anyone)
+    min_guest_type = models.IntegerField(choices=Person.Preference.choices, default=Person.Preference.ANYONE)
+    # what get_last_available_date gives for this night, only set on available nights
+    available_until = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['room', 'day'], name='roomdaystatus_room_day_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'day', 'min_guest_type'], name='roomdaystatus_search_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.room_id} {self.day} {self.get_status_display()}"
+
+
+# Finished bookings, moved here by the expiry sweep (catalog/expiry.py) so CustomEvent stays small
+# this is the guest history, read by the guest_history view and nothing writes to it afterwards
+# room, owner and host are copied as text as well, since rooms and people change long after a stay
+class ArchivedBooking(models.Model):
+    event_id = models.IntegerField()  # the CustomEvent it was
+    room = models.ForeignKey(Room, on_delete=models.SET_NULL, null=True, blank=True, related_name='archived_bookings')
+    room_name = models.CharField(max_length=100, blank=True)
+    room_owner = models.CharField(max_length=30, blank=True)
+    host = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='archived_bookings')
+    host_name = models.CharField(max_length=150, blank=True)
+    guest_name = models.CharField(max_length=20, blank=True, null=True)
+    guest_type = models.IntegerField(choices=CustomEvent.GuestType.choices, null=True, blank=True)
+    title = models.CharField(max_length=255, blank=True)
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+    created_on = models.DateTimeField(null=True, blank=True)
+    archived_on = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['start'], name='archivedbooking_start_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.guest_name} in {self.room_name} ({self.start:%Y-%m-%d})"
+
+
+# Emails waiting to go out. Views queue them here instead of talking to SMTP mid request,
+# tasks.send_email_outbox sends them in batches (catalog/outbox.py)
+class OutboxEmail(models.Model):
+    recipient = models.EmailField()
+    subject = models.CharField(max_length=200)
+    body = models.TextField()
+    created_on = models.DateTimeField(auto_now_add=True)
+    sent_on = models.DateTimeField(null=True, blank=True)
+    # failed sends back off, see outbox.retry_delay
+    attempts = models.IntegerField(default=0)
+    next_attempt = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    # the send_outbox run that's sending it, see outbox.claim_due
+    claim = models.CharField(max_length=32, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['sent_on', 'next_attempt'], name='outboxemail_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {self.recipient}"
 
 
 ###Signals###
@@ -212,60 +354,21 @@ def delete_calendar_when_room_deleted(sender, instance, **kwargs):
         instance.calendar.delete()
 
 
-# 1 of 2 - Domino effect for toggling is_offline on a building
-@receiver(post_save, sender=Building)
-def set_sections_and_rooms_offline(sender, instance, **kwargs):
-    sections = instance.sections.all()
-    for section in sections:
-        if section.is_offline != instance.is_offline:
-            section.is_offline = instance.is_offline
-            section.save()
-
-# 2 of 2 - Domino effect for toggling is_offline on a building
-@receiver(post_save, sender=Section)
-def set_rooms_offline(sender, instance, **kwargs):
-    rooms = instance.rooms.all()
-    for room in rooms:
-        if room.is_offline != instance.is_offline:
-            room.is_offline = instance.is_offline
-            room.save()
-
-# handles calendars on room creation and owner changes
+# keeps ownerless rooms permanently available
+# new rooms get their calendar from create_room_calendar in signals.py, see catalog/calendars.py
 @receiver(post_save, sender=Room)
 def handle_room_calendar(sender,instance,created, **kwargs):
     
-    if created:  # If it's a new Room instance
-    # Ensure the room has a calendar
-        if not instance.calendar:
-            instance.calendar = Calendar.objects.create()
-        # Name the calendar based on the room's owner or the room itself
-        if instance.owner:
-            instance.calendar.name = f"{instance.owner.name}'s Calendar"
-        else:
-            instance.calendar.name = f"Room {instance.number} in {instance.section}"
-        instance.calendar.save()
-
-
-    else:  # If the Room instance is being updated
-        # Check if the owner has changed
-        old_owner = instance.__class__.objects.get(pk=instance.pk).owner
-        if old_owner != instance.owner:
-            # Delete any availability events if the owner has changed
-            CustomEvent.objects.filter(
-                calendar=instance.calendar,
-                event_type='availability'
-            ).delete()
-
-            if instance.owner:
-                instance.calendar.name = f"{instance.owner.name}'s Calendar"
-            else:
-                instance.calendar.name = f"Room {instance.number} in {instance.section}"
-
-            instance.calendar.save()
-
+    # new rooms, and anything this cares about unchanged (number, image, section...), nothing to do
+    if created or not instance.has_changed(*Room.tracked_fields):
+        return
 
+    # An owner change leaves the calendar's availability and name alone, as it always has
+    # (the old check for one compared against the saved row, so it never fired)
+    # dropping availability on an owner change would have to send the displaced bookings
+    # through utils.reassign_displaced_bookings, not just delete them
 
-    if not instance.owner:
+    if not instance.owner and instance.calendar_id:
             # Create a permanent availability event
             never_date = timezone.make_aware(datetime(2999, 12, 31, 12, 0, 0), timezone.get_current_timezone())
             CustomEvent.objects.update_or_create(
@@ -276,4 +379,4 @@ def handle_room_calendar(sender,instance,created, **kwargs):
                     'end': never_date,
                     'title': "Permanent Availability"
                 }
-            )
\ No newline at end of file
+            )
@@ -0,0 +1,62 @@
+from django.db import transaction
+from django.utils import timezone
+
+from catalog.calendars import permanent_availability
+from catalog.models import CustomEvent, Room, Section
+from catalog.room_days import deferred_room_days, rebuild_room_days
+from catalog.utils import bulk_create_custom_events
+
+
+# Toggling is_offline on a building or section, in bulk
+# Used to domino through section.save() and room.save() one at a time, each re-fetching itself and firing
+# its own signals, over a thousand queries for a big building. Now it's a few update()s and one delete
+# in one transaction, and the side effects those saves used to have are done here by hand:
+#   - rooms in a section going offline lose their availability events (Section.save)
+#   - rooms without an owner get their Permanent Availability back (handle_room_calendar)
+#   - RoomDayStatus is rebuilt once per room touched (the room and event signals)
+
+
+# Sections that don't match the building follow it, then their rooms follow them
+def cascade_building_offline(building):
+    section_ids = list(building.sections.exclude(is_offline=building.is_offline).values_list('id', flat=True))
+    if not section_ids:
+        return
+
+    with transaction.atomic(), deferred_room_days():
+        Section.objects.filter(id__in=section_ids).update(is_offline=building.is_offline)
+        if building.is_offline:
+            delete_availability_events(section_ids)
+        cascade_rooms_offline(section_ids, is_offline=building.is_offline)
+
+
+# Rooms in these sections that don't match is_offline follow it
+def cascade_rooms_offline(section_ids, is_offline):
+    with transaction.atomic(), deferred_room_days():
+        changed = list(Room.objects.filter(section_id__in=section_ids).exclude(is_offline=is_offline).values_list('id', 'calendar_id', 'owner_id'))
+        if not changed:
+            return
+
+        room_ids = [room_id for room_id, _, _ in changed]
+        Room.objects.filter(id__in=room_ids).update(is_offline=is_offline)
+        ensure_permanent_availability([calendar_id for _, calendar_id, owner_id in changed if calendar_id and not owner_id])
+        rebuild_room_days(Room.objects.filter(id__in=room_ids).only('id'))
+
+
+# One delete for every availability event in these sections
+def delete_availability_events(section_ids):
+    CustomEvent.objects.filter(calendar__room__section_id__in=section_ids, event_type='availability').delete()
+
+
+# What handle_room_calendar's update_or_create does for an ownerless room, for a batch of calendars:
+# an existing availability is stretched from now to forever, calendars without one get one
+def ensure_permanent_availability(calendar_ids):
+    if not calendar_ids:
+        return
+
+    now = timezone.now()
+    existing = CustomEvent.objects.filter(calendar_id__in=calendar_ids, event_type='availability')
+    covered = set(existing.values_list('calendar_id', flat=True))
+    forever = permanent_availability(None, now)
+    existing.update(start=forever.start, end=forever.end, title=forever.title)
+
+    bulk_create_custom_events([permanent_availability(calendar_id, now) for calendar_id in calendar_ids if calendar_id not in covered])
@@ -0,0 +1,101 @@
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.mail import get_connection, send_mass_mail
+from django.utils import timezone
+
+from catalog.models import OutboxEmail
+
+
+# Queue now, send later
+# Requests write OutboxEmail rows (one insert however many emails), the send_email_outbox task
+# picks up whatever is due, rolls everything for the same address into one digest
+# and sends the lot over a single SMTP connection
+#
+# Runs can overlap (beat starts one a minute whatever a slow mail server is doing), so a run first
+# claims what's due with a single conditional update and only sends the rows it claimed
+
+FROM_EMAIL = "autoRoomAss@email.com"
+# after this many failed sends an email is left alone, it stays in the admin with its last_error
+MAX_ATTEMPTS = 5
+# a claim pushes next_attempt this far out, so a run that dies part way frees its emails for a later one
+CLAIM_TIMEOUT = timedelta(minutes=15)
+
+
+# emails is a list of (recipient, subject, body)
+def queue_emails(emails):
+    return OutboxEmail.objects.bulk_create([
+        OutboxEmail(recipient=recipient, subject=subject, body=body)
+        for recipient, subject, body in emails
+    ])
+
+
+# 1, 2, 4, 8... minutes, capped at a couple of hours
+def retry_delay(attempts):
+    return timedelta(minutes=min(2 ** max(attempts - 1, 0), 120))
+
+
+# One email per recipient, several queued changes become one digest
+def digest(emails):
+    if len(emails) == 1:
+        return emails[0].subject, emails[0].body
+    subject = f"{emails[0].subject} ({len(emails)} updates)"
+    body = "\n\n".join(f"- {email.body.strip()}" for email in emails)
+    return subject, body
+
+
+# Marks everything due as this run's and returns it, oldest first
+# a row another run already claimed isn't due any more, so no email is in two runs at once
+def claim_due(now):
+    claim = uuid.uuid4().hex
+    OutboxEmail.objects.filter(
+        sent_on__isnull=True,
+        next_attempt__lte=now,
+        attempts__lt=MAX_ATTEMPTS,
+    ).update(claim=claim, next_attempt=now + CLAIM_TIMEOUT)
+    return list(OutboxEmail.objects.filter(claim=claim, sent_on__isnull=True).order_by('created_on', 'id'))
+
+
+# Send everything that's due. Returns {'sent': emails sent, 'digests': messages sent, 'failed': emails put back}
+# A recipient whose digest fails gets its emails pushed back by retry_delay, the rest still go out
+# If the connection can't even be opened this raises, the claimed emails are handed back for the next run
+def send_outbox(now=None, connection=None):
+    now = now or timezone.now()
+
+    by_recipient = defaultdict(list)
+    for email in claim_due(now):
+        by_recipient[email.recipient].append(email)
+
+    report = {'sent': 0, 'digests': 0, 'failed': 0}
+    if not by_recipient:
+        return report
+
+    connection = connection or get_connection()
+    try:
+        connection.open()
+    except Exception:
+        ids = [email.id for emails in by_recipient.values() for email in emails]
+        OutboxEmail.objects.filter(id__in=ids).update(next_attempt=now)
+        raise
+    try:
+        for recipient, emails in by_recipient.items():
+            subject, body = digest(emails)
+            ids = [email.id for email in emails]
+            try:
+                send_mass_mail([(subject, body, FROM_EMAIL, [recipient])], fail_silently=False, connection=connection)
+            except Exception as error:
+                attempts = max(email.attempts for email in emails) + 1
+                OutboxEmail.objects.filter(id__in=ids).update(
+                    attempts=attempts,
+                    next_attempt=now + retry_delay(attempts),
+                    last_error=str(error),
+                )
+                report['failed'] += len(emails)
+            else:
+                OutboxEmail.objects.filter(id__in=ids).update(sent_on=now)
+                report['sent'] += len(emails)
+                report['digests'] += 1
+    finally:
+        connection.close()
+    return report
@@ -0,0 +1,196 @@
+import csv
+import json
+import time
+
+from django.db import transaction
+
+from catalog.caching import bump_calendars, bump_people, bump_rooms
+from catalog.calendars import create_rooms
+from catalog.models import Building, Person, Room, RoomDayStatus, Section
+
+
+# Provisioning buildings from a file instead of clicking through the admin
+# CSV is one row per room:
+#   building,area,section,room,owner,preference,offline
+# (optional building_offline / section_offline columns too)
+# JSON is nested, buildings -> sections -> rooms:
+#   [{"name": "Main", "area": "courtyard", "sections": [{"name": "Upstairs", "rooms": [{"number": 1, "owner": "Ann", "preference": "known"}]}]}]
+#
+# Buildings, sections and owners are matched by name and rooms by number within their section, so
+# running the same file twice only adds what's new. Everything goes in with bulk_create, calendars
+# and permanent availability via calendars.create_rooms(), in one transaction
+
+
+class ImportFileError(ValueError):
+    pass
+
+
+PREFERENCES = {
+    'anyone': Person.Preference.ANYONE,
+    'known': Person.Preference.KNOWN,
+    'members': Person.Preference.MEMBERS,
+}
+
+
+def parse_flag(value):
+    if isinstance(value, bool):
+        return value
+    return str(value or '').strip().lower() in ('1', 'true', 'yes', 'y', 'offline')
+
+
+def parse_preference(value, line):
+    if value in (None, ''):
+        return None
+    value = str(value).strip().lower()
+    if value.isdigit() and int(value) in Person.Preference.values:
+        return int(value)
+    if value in PREFERENCES:
+        return PREFERENCES[value]
+    raise ImportFileError(f"{line}: unknown preference {value!r}, use one of {', '.join(PREFERENCES)}")
+
+
+# Flat rows (dicts) from a CSV or JSON file, format from the extension unless given
+def read_rows(path, format=None):
+    format = format or ('json' if str(path).endswith('.json') else 'csv')
+    with open(path, newline='') as f:
+        if format == 'csv':
+            return [dict(row, line=f"line {i}") for i, row in enumerate(csv.DictReader(f), start=2)]
+        return flatten(json.load(f))
+
+
+def flatten(buildings):
+    rows = []
+    for building in buildings:
+        for section in building.get('sections', []):
+            for room in section.get('rooms', []):
+                rows.append({
+                    'building': building.get('name'),
+                    'area': building.get('area', ''),
+                    'building_offline': building.get('is_offline', False),
+                    'section': section.get('name'),
+                    'section_offline': section.get('is_offline', False),
+                    'room': room.get('number'),
+                    'owner': room.get('owner') or '',
+                    'preference': room.get('preference'),
+                    'offline': room.get('is_offline', False),
+                    'line': f"{building.get('name')} / {section.get('name')} / {room.get('number')}",
+                })
+    return rows
+
+
+def clean(rows):
+    cleaned = []
+    for i, row in enumerate(rows, start=1):
+        line = row.get('line') or f"row {i}"
+        building, section = (row.get('building') or '').strip(), (row.get('section') or '').strip()
+        if not building or not section:
+            raise ImportFileError(f"{line}: building and section are required")
+        try:
+            number = int(row.get('room'))
+        except (TypeError, ValueError):
+            raise ImportFileError(f"{line}: room number {row.get('room')!r} isn't a number")
+        cleaned.append({
+            'building': building,
+            'area': (row.get('area') or '').strip(),
+            'building_offline': parse_flag(row.get('building_offline')),
+            'section': section,
+            'section_offline': parse_flag(row.get('section_offline')),
+            'room': number,
+            'owner': (row.get('owner') or '').strip(),
+            'preference': parse_preference(row.get('preference'), line),
+            'offline': parse_flag(row.get('offline')),
+            'line': line,
+        })
+    return cleaned
+
+
+# Returns a report: counts of what was created / updated / skipped, and rows per second
+def import_rooms(rows):
+    started = time.monotonic()
+    rows = clean(rows)
+    report = {'rows': len(rows), 'buildings': 0, 'sections': 0, 'owners': 0, 'preferences': 0, 'rooms': 0, 'skipped': 0}
+
+    with transaction.atomic():
+        buildings = {building.name: building for building in Building.objects.filter(name__in={row['building'] for row in rows})}
+        new_buildings = {}
+        for row in rows:
+            if row['building'] not in buildings and row['building'] not in new_buildings:
+                new_buildings[row['building']] = Building(name=row['building'], area=row['area'], is_offline=row['building_offline'])
+        buildings.update({building.name: building for building in Building.objects.bulk_create(new_buildings.values())})
+        report['buildings'] = len(new_buildings)
+
+        sections = {
+            (section.building.name, section.name): section
+            for section in Section.objects.select_related('building').filter(building__in=buildings.values(), name__in={row['section'] for row in rows})
+        }
+        new_sections = {}
+        for row in rows:
+            key = (row['building'], row['section'])
+            if key not in sections and key not in new_sections:
+                building = buildings[row['building']]
+                new_sections[key] = Section(building=building, name=row['section'], is_offline=row['section_offline'] or building.is_offline)
+        sections.update(zip(new_sections, Section.objects.bulk_create(new_sections.values())))
+        report['sections'] = len(new_sections)
+
+        existing_rooms = set(Room.objects.filter(section__in=sections.values()).values_list('section_id', 'number'))
+        owners = owners_for(rows, report)
+
+        rooms, claimed = [], {}
+        for row in rows:
+            section = sections[(row['building'], row['section'])]
+            if (section.id, row['room']) in existing_rooms:
+                report['skipped'] += 1
+                continue
+            existing_rooms.add((section.id, row['room']))
+
+            owner = owners.get(row['owner'])
+            if owner:
+                if owner.id in claimed or owner.owned_room_id:
+                    raise ImportFileError(f"{row['line']}: {owner.name} already has a room")
+                claimed[owner.id] = row
+            rooms.append(Room(section=section, number=row['room'], owner=owner, is_offline=row['offline'] or section.is_offline))
+
+        create_rooms(rooms)
+        report['rooms'] = len(rooms)
+        # the buildings, sections and people were bulk created, no signals
+        bump_rooms()
+        bump_people()
+
+    report['seconds'] = time.monotonic() - started
+    report['rows_per_second'] = report['rows'] / report['seconds'] if report['seconds'] else 0
+    return report
+
+
+# Owners by name, existing people are reused (and their preference updated), the rest bulk_created
+def owners_for(rows, report):
+    wanted = {}
+    for row in rows:
+        if row['owner']:
+            wanted.setdefault(row['owner'], row['preference'])
+
+    owners = {}
+    for person in Person.objects.filter(name__in=wanted).select_related('room').order_by('id'):
+        owners.setdefault(person.name, person)
+    for person in owners.values():
+        person.owned_room_id = getattr(person, 'room', None) and person.room.id
+
+    changed = [person for name, person in owners.items() if wanted[name] and person.preference != wanted[name]]
+    for person in changed:
+        person.preference = wanted[person.name]
+    Person.objects.bulk_update(changed, ['preference'])
+    # what the Person post_save signal would have done
+    for preference in {person.preference for person in changed}:
+        RoomDayStatus.objects.filter(room__owner__in=[person for person in changed if person.preference == preference]).update(min_guest_type=preference)
+    bump_calendars(person.room.calendar_id for person in changed if getattr(person, 'room', None))
+    report['preferences'] = len(changed)
+
+    new = [
+        Person(name=name, preference=preference or Person.Preference.ANYONE)
+        for name, preference in wanted.items()
+        if name not in owners
+    ]
+    for person in Person.objects.bulk_create(new):
+        person.owned_room_id = None
+        owners[person.name] = person
+    report['owners'] = len(new)
+    return owners
@@ -0,0 +1,165 @@
+import threading
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from catalog.caching import bump_calendars
+from catalog.intervals import CalendarIndex
+from catalog.models import Person, Room, RoomDayStatus
+
+
+# Upkeep and lookups for the RoomDayStatus table (models.py)
+#
+# A room's rows are thrown away and rebuilt whenever one of its events or the room itself changes
+# (receivers in signals.py), and every room is rolled forward once a day (tasks.refresh_room_days)
+# Rebuilding a room is two queries however many of its events changed, so nothing tries to patch single days
+#
+# Multi-night stays are answered night by night, which matches Room.is_available as long as
+# availabilities are merged (merge_overlapping_availabilities) and bookings run noon to noon, which the views enforce
+
+# Same 90 days DateRangeForm.clean allows, plus yesterday since start dates can be a day back
+HORIZON_DAYS = 90
+
+
+# (first night, last night) kept in the table
+def horizon():
+    today = timezone.localdate()
+    return today - timedelta(days=1), today + timedelta(days=HORIZON_DAYS - 1)
+
+
+# The stay a night stands for, same times available_rooms searches with
+# (what utils.date_to_aware_datetime does, spelled out so utils can import from here)
+def night_bounds(day):
+    start = timezone.make_aware(datetime.combine(day, time(23, 59)))
+    end = timezone.make_aware(datetime.combine(day + timedelta(days=1), time(11, 59)))
+    return start, end
+
+
+# index is the room's CalendarIndex
+def night_status(room, index, day):
+    start, end = night_bounds(day)
+    if room.is_offline:
+        return RoomDayStatus.Status.OFFLINE
+    if index.occupancy.overlaps(start, end):
+        return RoomDayStatus.Status.BOOKED
+    if room.calendar_id and index.availability.covers(start, end):
+        return RoomDayStatus.Status.AVAILABLE
+    return RoomDayStatus.Status.UNAVAILABLE
+
+
+# Bulk changes (offline cascades and the like) fire a signal per event or room,
+# inside deferred_room_days() those just note the room and each one is rebuilt once at the end
+_deferred = threading.local()
+
+
+@contextmanager
+def deferred_room_days():
+    if getattr(_deferred, 'room_ids', None) is not None:
+        # already deferring, the outermost block does the rebuild
+        yield
+        return
+
+    _deferred.room_ids, _deferred.calendar_ids = set(), set()
+    try:
+        yield
+        room_ids, calendar_ids = _deferred.room_ids, _deferred.calendar_ids
+    finally:
+        _deferred.room_ids = _deferred.calendar_ids = None
+
+    if room_ids or calendar_ids:
+        rebuild_room_days(Room.objects.select_related('owner').filter(Q(id__in=room_ids) | Q(calendar_id__in=calendar_ids)))
+
+
+def deferring():
+    return getattr(_deferred, 'room_ids', None) is not None
+
+
+# Recompute every night in the horizon for these rooms, one event query for the lot
+# rooms should have owner selected if there are many of them
+def rebuild_room_days(rooms):
+    if deferring():
+        _deferred.room_ids.update(room.id for room in rooms)
+        return
+
+    rooms = list(rooms)
+    if not rooms:
+        return
+
+    first_day, last_day = horizon()
+    days = [first_day + timedelta(days=i) for i in range((last_day - first_day).days + 1)]
+    indexes = CalendarIndex.for_calendars(
+        [room.calendar_id for room in rooms if room.calendar_id],
+        after=night_bounds(first_day)[0],
+    )
+
+    rows = []
+    for room in rooms:
+        index = indexes.get(room.calendar_id, CalendarIndex())
+        min_guest_type = room.owner.preference if room.owner else Person.Preference.ANYONE
+        for day in days:
+            status = night_status(room, index, day)
+            available_until = None
+            if status == RoomDayStatus.Status.AVAILABLE:
+                available_until = index.last_available_date(night_bounds(day)[0])
+            rows.append(RoomDayStatus(room=room, day=day, status=status, min_guest_type=min_guest_type, available_until=available_until))
+
+    with transaction.atomic():
+        # all of the room's rows, so nights that fell out of the horizon go too
+        RoomDayStatus.objects.filter(room__in=rooms).delete()
+        RoomDayStatus.objects.bulk_create(rows)
+    # every bulk path comes through here, so cached results for these rooms go stale here too
+    bump_calendars(room.calendar_id for room in rooms)
+
+
+# For the CustomEvent receivers, which only know the calendar
+def rebuild_calendar_days(calendar_id):
+    if deferring():
+        _deferred.calendar_ids.add(calendar_id)
+        return
+    rebuild_room_days(Room.objects.select_related('owner').filter(calendar_id=calendar_id))
+
+
+# Does an event touch any night in the horizon
+def in_horizon(start, end):
+    first_day, last_day = horizon()
+    return end > night_bounds(first_day)[0] and start < night_bounds(last_day)[1]
+
+
+# Daily roll forward (and the backfill after migrating), chunked so memory stays flat on big trees
+def refresh_room_days(chunk_size=200):
+    room_ids = list(Room.objects.order_by('id').values_list('id', flat=True))
+    for i in range(0, len(room_ids), chunk_size):
+        rebuild_room_days(Room.objects.select_related('owner').filter(id__in=room_ids[i:i + chunk_size]))
+    RoomDayStatus.objects.filter(day__lt=horizon()[0]).delete()
+    return len(room_ids)
+
+
+# Table backed version of availability.find_available_rooms for whole nights [start_day, end_day)
+# one query: rooms with an available, guest-type-compatible row for every night, plus the first night's available_until
+#
+# returns a list of (room, last_available_date) in rooms' order, or None when the table can't answer
+# (same day searches, dates outside the horizon, or a table that hasn't been filled yet) so the caller can fall back
+def find_available_rooms_by_day(rooms, start_day, end_day, guest_type):
+    first_day, last_day = horizon()
+    nights = (end_day - start_day).days
+    if nights < 1 or start_day < first_day or end_day - timedelta(days=1) > last_day:
+        return None
+    # every room with a calendar needs its rows, one room's rows (the first event saved after migrating) isn't a filled table
+    has_rows = RoomDayStatus.objects.filter(room=OuterRef('pk'), day=end_day - timedelta(days=1))
+    if rooms.filter(calendar__isnull=False).exclude(Exists(has_rows)).exists():
+        return None
+
+    free_every_night = RoomDayStatus.objects.filter(
+        status=RoomDayStatus.Status.AVAILABLE,
+        day__gte=start_day,
+        day__lt=end_day,
+        min_guest_type__lte=int(guest_type),
+    ).values('room').annotate(nights=Count('id')).filter(nights=nights).values('room')
+
+    first_night = RoomDayStatus.objects.filter(room=OuterRef('pk'), day=start_day).values('available_until')[:1]
+
+    rooms = rooms.filter(id__in=free_every_night).annotate(last_available_date=Subquery(first_night))
+    return [(room, room.last_available_date) for room in rooms]
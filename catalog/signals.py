@@ -3,24 +3,99 @@ from django.db.models.signals import post_save
 from django.dispatch import receiver
 from schedule.models import Calendar
 from .models import Room
-from django.utils.text import slugify
-import uuid
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_save, post_delete, pre_delete
 from django.dispatch import receiver
-from .models import Room, Person
+from .models import Building, Room, Person, CustomEvent, RoomDayStatus, Section
+from .caching import bump_calendars, bump_people, bump_rooms
+from .calendars import create_room_calendars
+from .offline import cascade_building_offline, cascade_rooms_offline
+from .room_days import in_horizon, rebuild_calendar_days, rebuild_room_days
 
+# The one creation path for room calendars, see calendars.py
+# no second room.save() any more, so the rest of the Room signals only run once
 @receiver(post_save, sender=Room)
-def create_room_calendar(sender, instance, created, **kwargs):
-    if created:
-        base_slug = slugify(f"room-{instance.number}-calendar")
-        unique_slug = base_slug
-        num = 1
-        while Calendar.objects.filter(slug=unique_slug).exists():
-            unique_slug = f"{base_slug}-{num}"
-            num += 1
-
-
-        calendar_name = f"Room {instance.number} Calendar"
-        calendar = Calendar.objects.create(name=calendar_name, slug=unique_slug)
-        instance.calendar = calendar
-        instance.save()
+def create_room_calendar(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        create_room_calendars([instance])
+
+# 1 of 2 - Domino effect for toggling is_offline on a building, see offline.py
+@receiver(post_save, sender=Building)
+def set_sections_and_rooms_offline(sender, instance, **kwargs):
+    if instance.has_changed('is_offline'):
+        cascade_building_offline(instance)
+
+# 2 of 2 - Domino effect for toggling is_offline on a section (Section.save already dropped the availability)
+@receiver(post_save, sender=Section)
+def set_rooms_offline(sender, instance, created, **kwargs):
+    if not created and instance.has_changed('is_offline'):
+        cascade_rooms_offline([instance.id], instance.is_offline)
+
+
+# Keeping RoomDayStatus (the per night availability table) in step, see room_days.py
+
+@receiver(post_save, sender=CustomEvent)
+def rebuild_days_on_event_save(sender, instance, created, **kwargs):
+    # new events nowhere near the horizon can't change it, edits might have moved out of it so always count
+    if created and not in_horizon(instance.start, instance.end):
+        return
+    rebuild_calendar_days(instance.calendar_id)
+
+@receiver(post_delete, sender=CustomEvent)
+def rebuild_days_on_event_delete(sender, instance, **kwargs):
+    if in_horizon(instance.start, instance.end):
+        rebuild_calendar_days(instance.calendar_id)
+
+@receiver(post_save, sender=Room)
+def rebuild_days_on_room_save(sender, instance, created, **kwargs):
+    # renumbering a room or changing its picture doesn't change a single night
+    if created or instance.has_changed(*Room.tracked_fields):
+        rebuild_room_days([instance])
+
+# the room's calendar is about to be nulled out, nothing on it is available any more
+@receiver(pre_delete, sender=Calendar)
+def clear_days_on_calendar_delete(sender, instance, **kwargs):
+    RoomDayStatus.objects.filter(room__calendar=instance).delete()
+
+# only the guest type threshold depends on the owner
+@receiver(post_save, sender=Person)
+def update_days_on_preference_change(sender, instance, **kwargs):
+    RoomDayStatus.objects.filter(room__owner=instance).exclude(min_guest_type=instance.preference).update(min_guest_type=instance.preference)
+
+# the room's owner is set to NULL by a queryset update, no Room save, so its rows go back to anyone here
+@receiver(pre_delete, sender=Person)
+def reset_days_on_owner_delete(sender, instance, **kwargs):
+    RoomDayStatus.objects.filter(room__owner=instance).update(min_guest_type=Person.Preference.ANYONE)
+
+
+# Keeping the cached available_rooms results honest, see caching.py
+# (the bulk paths bump through rebuild_room_days)
+
+@receiver(post_save, sender=CustomEvent)
+@receiver(post_delete, sender=CustomEvent)
+def bump_calendar_on_event_change(sender, instance, **kwargs):
+    bump_calendars([instance.calendar_id])
+
+# any save, cached results hold the rooms themselves (number, image...) not just what they're tracked for
+@receiver(post_save, sender=Room)
+def bump_on_room_save(sender, instance, **kwargs):
+    bump_rooms()
+
+# room names include the section and building, and offline toggles change everything under them
+@receiver(post_delete, sender=Room)
+@receiver(post_save, sender=Section)
+@receiver(post_delete, sender=Section)
+@receiver(post_save, sender=Building)
+def bump_rooms_on_change(sender, instance, **kwargs):
+    bump_rooms()
+
+# pre_delete too, the room's link to its owner is gone by post_delete
+@receiver(post_save, sender=Person)
+@receiver(pre_delete, sender=Person)
+def bump_calendar_on_owner_change(sender, instance, **kwargs):
+    bump_calendars(Room.objects.filter(owner=instance).values_list('calendar_id', flat=True))
+
+# names, new members, members leaving (their room's owner goes with them, without a Room save)
+@receiver(post_save, sender=Person)
+@receiver(post_delete, sender=Person)
+def bump_people_on_change(sender, instance, **kwargs):
+    bump_people()
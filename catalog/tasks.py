@@ -1,10 +1,36 @@
 from celery import shared_task
-from django.utils import timezone
-from catalog.models import CustomEvent  # Replace with your actual model
+from celery.utils.log import get_task_logger
+from catalog import expiry
+from catalog.outbox import send_outbox
+from catalog.room_days import refresh_room_days
 
+logger = get_task_logger(__name__)
+
+# how long one run of the sweep gets before it hands over to a fresh task
+SWEEP_SECONDS = 60
+
+# Deletes events that are over, in batches (see expiry.py)
+# a run that runs out of time queues the next one from where it stopped
+@shared_task(bind=True)
+def delete_ended_events(self, after_pk=0):
+    report = expiry.delete_ended_events(
+        after_pk=after_pk,
+        max_seconds=SWEEP_SECONDS,
+        progress=lambda report: logger.info("Deleted %s ended event(s) so far, up to pk %s", report['deleted'], report['last_pk']),
+    )
+    logger.info("Deleted %s ended event(s), archived %s booking(s), in %s batch(es)%s",
+                report['deleted'], report['archived'], report['batches'], "" if report['finished'] else ", continuing")
+    if not report['finished']:
+        self.apply_async(kwargs={'after_pk': report['last_pk']}, countdown=5)
+    return {key: value for key, value in report.items() if key != 'cutoff'}
+
+# Rolls the per night availability table forward a day (see room_days.py)
 @shared_task
-def delete_ended_events():
-    
-        return
+def refresh_room_days_task():
+    return refresh_room_days()
 
-    
\ No newline at end of file
+# Sends queued emails (see outbox.py), beat runs it every minute
+# no retries of its own, if the mail server can't be reached the next beat run tries again
+@shared_task
+def send_email_outbox():
+    return send_outbox()
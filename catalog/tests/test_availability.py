@@ -0,0 +1,222 @@
+from django.test import TestCase
+from catalog.models import Person, Building, Section, CustomEvent, Room
+from catalog.availability import find_available_rooms, reassignment_candidates
+from catalog.intervals import IntervalIndex, CalendarIndex
+from schedule.models import Calendar
+from datetime import datetime
+import random
+from django.utils import timezone
+from django.utils.text import slugify
+
+
+def aware(*args):
+    return timezone.make_aware(datetime(*args))
+
+
+class FindAvailableRoomsTest(TestCase):
+
+    def setUp(self):
+        self.building = Building.objects.create(name="Testbuilding")
+        self.section = Section.objects.create(name="Testsection", building=self.building)
+
+    def make_room(self, number, owner=None):
+        room = Room.objects.create(
+            number=number,
+            section=self.section,
+            calendar=Calendar.objects.create(slug=slugify(f"test-{number}")),
+            owner=owner,
+        )
+        # start from a clean calendar, ownerless rooms get a permanent availability on creation
+        CustomEvent.objects.filter(calendar=room.calendar).delete()
+        return room
+
+    def add_event(self, room, event_type, start, end):
+        return CustomEvent.objects.create(calendar=room.calendar, event_type=event_type, start=start, end=end)
+
+    def rooms(self):
+        return Room.objects.select_related('section__building', 'owner').order_by('number')
+
+    def test_matches_per_room_methods(self):
+        free = self.make_room(1)
+        self.add_event(free, 'availability', aware(3000, 1, 1, 12), aware(3000, 1, 20, 12))
+        self.add_event(free, 'occupancy', aware(3000, 1, 12, 12), aware(3000, 1, 14, 12))
+
+        booked = self.make_room(2)
+        self.add_event(booked, 'availability', aware(3000, 1, 1, 12), aware(3000, 1, 20, 12))
+        self.add_event(booked, 'occupancy', aware(3000, 1, 4, 12), aware(3000, 1, 6, 12))
+
+        too_short = self.make_room(3)
+        self.add_event(too_short, 'availability', aware(3000, 1, 1, 12), aware(3000, 1, 5, 12))
+
+        picky = self.make_room(4, owner=Person.objects.create(name="Picky", preference=Person.Preference.MEMBERS))
+        self.add_event(picky, 'availability', aware(3000, 1, 1, 12), aware(3000, 1, 20, 12))
+
+        offline = self.make_room(5)
+        self.add_event(offline, 'availability', aware(3000, 1, 1, 12), aware(3000, 1, 20, 12))
+        offline.is_offline = True
+        offline.save()
+
+        start, end = aware(3000, 1, 5, 23, 59), aware(3000, 1, 8, 11, 59)
+        result = find_available_rooms(self.rooms(), start, end, 2)
+
+        expected = [
+            (room, room.get_last_available_date(start)) for room in self.rooms()
+            if room.is_available(start, end) and (not room.owner or 2 >= room.owner.preference)
+        ]
+        self.assertEqual(result, expected)
+        self.assertEqual(result, [(free, aware(3000, 1, 12, 12))])
+
+    def test_fixed_query_count(self):
+        for number in range(1, 11):
+            room = self.make_room(number)
+            self.add_event(room, 'availability', aware(3000, 1, 1, 12), aware(3000, 1, 20, 12))
+            self.add_event(room, 'occupancy', aware(3000, 1, 2 + number % 3, 12), aware(3000, 1, 4, 12))
+
+        rooms = list(self.rooms())
+        # one event query no matter how many rooms
+        with self.assertNumQueries(1):
+            result = find_available_rooms(rooms, aware(3000, 1, 5, 23, 59), aware(3000, 1, 8, 11, 59), 1)
+        self.assertEqual(len(result), 10)
+
+    def test_no_rooms(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(find_available_rooms([], aware(3000, 1, 5), aware(3000, 1, 8), 1), [])
+
+
+class IntervalIndexTest(TestCase):
+
+    def setUp(self):
+        self.building = Building.objects.create(name="Testbuilding")
+        self.section = Section.objects.create(name="Testsection", building=self.building)
+        self.room = Room.objects.create(number=1, section=self.section, calendar=Calendar.objects.create(slug="test-1"))
+        CustomEvent.objects.filter(calendar=self.room.calendar).delete()
+
+        self.avail_1 = self.add_event('availability', aware(3000, 1, 1, 12), aware(3000, 1, 10, 12))
+        self.avail_2 = self.add_event('availability', aware(3000, 1, 15, 12), aware(3000, 1, 30, 12))
+        self.occ_1 = self.add_event('occupancy', aware(3000, 1, 3, 12), aware(3000, 1, 5, 12))
+        self.occ_2 = self.add_event('occupancy', aware(3000, 1, 20, 12), aware(3000, 1, 22, 12))
+
+    def add_event(self, event_type, start, end):
+        return CustomEvent.objects.create(calendar=self.room.calendar, event_type=event_type, start=start, end=end)
+
+    def test_covers_and_overlaps(self):
+        index = IntervalIndex([self.avail_1, self.avail_2])
+        self.assertTrue(index.covers(aware(3000, 1, 2), aware(3000, 1, 10, 12)))
+        self.assertFalse(index.covers(aware(3000, 1, 9), aware(3000, 1, 16)))
+        self.assertTrue(index.overlaps(aware(3000, 1, 9), aware(3000, 1, 16)))
+        self.assertFalse(index.overlaps(aware(3000, 1, 11), aware(3000, 1, 14)))
+        # touching ends don't count as overlap
+        self.assertFalse(index.overlaps(aware(3000, 1, 10, 12), aware(3000, 1, 15, 12)))
+
+    def test_containing_within_and_next(self):
+        index = IntervalIndex([self.occ_2, self.occ_1])
+        self.assertEqual(list(index), [self.occ_1, self.occ_2])
+        self.assertEqual(index.containing(aware(3000, 1, 4)), [self.occ_1])
+        self.assertEqual(index.containing(aware(3000, 1, 6)), [])
+        self.assertEqual(index.within(aware(3000, 1, 1), aware(3000, 1, 21)), [self.occ_1])
+        self.assertEqual(index.next_starting(aware(3000, 1, 4)), self.occ_2)
+        self.assertIsNone(index.next_starting(aware(3000, 1, 4), before=aware(3000, 1, 20)))
+        self.assertIsNone(index.next_starting(aware(3000, 1, 21)))
+
+    def test_gaps(self):
+        index = IntervalIndex([self.occ_1, self.occ_2])
+        self.assertEqual(index.gaps(aware(3000, 1, 1), aware(3000, 1, 25)), [
+            (aware(3000, 1, 1), aware(3000, 1, 3, 12)),
+            (aware(3000, 1, 5, 12), aware(3000, 1, 20, 12)),
+            (aware(3000, 1, 22, 12), aware(3000, 1, 25)),
+        ])
+        self.assertEqual(index.gaps(aware(3000, 1, 4), aware(3000, 1, 5)), [])
+
+    def test_calendar_index_matches_room_methods(self):
+        with self.assertNumQueries(1):
+            index = CalendarIndex.for_calendar(self.room.calendar)
+
+        checks = [
+            (aware(3000, 1, 1, 12), aware(3000, 1, 3, 12)),
+            (aware(3000, 1, 2), aware(3000, 1, 4)),
+            (aware(3000, 1, 5, 12), aware(3000, 1, 10, 12)),
+            (aware(3000, 1, 16), aware(3000, 1, 25)),
+            (aware(3000, 1, 22, 12), aware(3000, 1, 30, 12)),
+            (aware(3000, 1, 11), aware(3000, 1, 12)),
+        ]
+        for start, end in checks:
+            self.assertEqual(self.room.is_available(start, end, index=index), self.room.is_available(start, end))
+            self.assertEqual(self.room.get_last_available_date(start, index=index), self.room.get_last_available_date(start))
+
+        with self.assertNumQueries(0):
+            self.room.is_available(aware(3000, 1, 16), aware(3000, 1, 18), index=index)
+            self.room.get_last_available_date(aware(3000, 1, 16), index=index)
+
+
+class ReassignmentCandidatesTest(TestCase):
+
+    def setUp(self):
+        self.home = Building.objects.create(name="Home", area="courtyard")
+        self.neighbour = Building.objects.create(name="Neighbour", area="courtyard")
+        self.away = Building.objects.create(name="Away", area="not_courtyard")
+        self.rooms_made = 0
+        self.original = self.make_room(self.home)
+        self.start, self.end = aware(3000, 1, 5, 12, 1), aware(3000, 1, 8, 11, 59)
+
+    def make_room(self, building, free=True, owner=None):
+        self.rooms_made += 1
+        section = Section.objects.create(name=f"Section {self.rooms_made}", building=building)
+        room = Room.objects.create(number=self.rooms_made, section=section, owner=owner,
+                                   calendar=Calendar.objects.create(slug=f"test-{self.rooms_made}"))
+        CustomEvent.objects.filter(calendar=room.calendar).delete()
+        if free:
+            CustomEvent.objects.create(calendar=room.calendar, event_type='availability', start=aware(3000, 1, 1, 12, 1), end=aware(3000, 1, 20, 11, 59))
+        return room
+
+    def candidates(self, guest_type=CustomEvent.GuestType.STRANGER, **kwargs):
+        return reassignment_candidates(self.original, [(self.start, self.end, guest_type)], **kwargs)[0]
+
+    def test_several_windows_in_one_query(self):
+        early = self.make_room(self.home)
+        CustomEvent.objects.create(calendar=early.calendar, event_type='occupancy', start=aware(3000, 1, 10, 12, 1), end=aware(3000, 1, 12, 11, 59))
+        late = self.make_room(self.away)
+        CustomEvent.objects.create(calendar=late.calendar, event_type='occupancy', start=aware(3000, 1, 5, 12, 1), end=aware(3000, 1, 7, 11, 59))
+
+        self.original = Room.objects.select_related('section__building').get(id=self.original.id)
+        with self.assertNumQueries(1):
+            candidates = reassignment_candidates(self.original, [
+                (self.start, self.end, None),
+                (aware(3000, 1, 10, 12, 1), aware(3000, 1, 11, 11, 59), None),
+                (aware(3000, 1, 25, 12, 1), aware(3000, 1, 26, 11, 59), None),
+            ])
+        self.assertEqual(candidates, [[early], [late], []])
+        self.assertEqual(reassignment_candidates(self.original, []), [])
+
+    def test_only_rooms_that_can_take_the_guest(self):
+        free = self.make_room(self.home)
+        self.make_room(self.home, free=False)
+        picky = self.make_room(self.home, owner=Person.objects.create(name="Picky", preference=Person.Preference.KNOWN))
+        offline = self.make_room(self.home)
+        offline.is_offline = True
+        offline.save()
+        booked = self.make_room(self.home)
+        CustomEvent.objects.create(calendar=booked.calendar, event_type='occupancy', start=aware(3000, 1, 7, 12, 1), end=aware(3000, 1, 9, 11, 59))
+        CustomEvent.objects.create(calendar=self.original.calendar, event_type='availability', start=aware(3000, 1, 1), end=aware(3000, 1, 20))
+
+        self.assertEqual(self.candidates(), [free])
+        self.assertEqual(set(self.candidates(CustomEvent.GuestType.KNOWN)), {free, picky})
+        # unknown guest type is treated as a stranger
+        self.assertEqual(self.candidates(None), [free])
+        for room in Room.objects.exclude(id=self.original.id):
+            expected = room.is_available(self.start, self.end) and (not room.owner or room.owner.preference <= CustomEvent.GuestType.KNOWN)
+            self.assertEqual(room in self.candidates(CustomEvent.GuestType.KNOWN), expected)
+
+    def test_ranked_by_proximity_and_shuffled_within(self):
+        away = [self.make_room(self.away) for _ in range(3)]
+        neighbour = [self.make_room(self.neighbour) for _ in range(3)]
+        home = [self.make_room(self.home) for _ in range(3)]
+
+        self.original = Room.objects.select_related('section__building').get(id=self.original.id)
+        with self.assertNumQueries(1):
+            candidates = self.candidates()
+        self.assertEqual(set(candidates[:3]), set(home))
+        self.assertEqual(set(candidates[3:6]), set(neighbour))
+        self.assertEqual(set(candidates[6:]), set(away))
+
+        orders = {tuple(self.candidates(rng=random.Random(seed))) for seed in range(20)}
+        self.assertGreater(len(orders), 1)
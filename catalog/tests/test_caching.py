@@ -0,0 +1,157 @@
+from django.test import TestCase
+from django.core.cache import caches
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from catalog import caching
+from catalog.calendars import create_rooms
+from catalog.forms import RoomSelectForm
+from catalog.models import Building, CustomEvent, Person, Room, Section
+from catalog.provisioning import import_rooms
+from schedule.models import Calendar
+from datetime import datetime, timedelta
+from django.utils import timezone
+
+
+class CachedAvailableRoomsTest(TestCase):
+
+    def setUp(self):
+        caches[caching.CACHE_ALIAS].clear()
+        caching.counters.clear()
+        building = Building.objects.create(name="Testbuilding")
+        self.section = Section.objects.create(name="Testsection", building=building)
+        self.owner = Person.objects.create(name="Owner")
+        self.rooms = [
+            Room.objects.create(number=1, section=self.section, calendar=Calendar.objects.create(slug="cached-1")),
+            Room.objects.create(number=2, section=self.section, owner=self.owner, calendar=Calendar.objects.create(slug="cached-2")),
+        ]
+        self.day = timezone.localdate() + timedelta(days=5)
+        start = timezone.make_aware(datetime.combine(self.day, datetime.min.time())) - timedelta(days=2)
+        CustomEvent.objects.create(calendar=self.rooms[1].calendar, event_type='availability', start=start, end=start + timedelta(days=10), title="Away")
+
+        session = self.client.session
+        session['start_date'] = str(self.day)
+        session['end_date'] = str(self.day + timedelta(days=2))
+        session['guest_type'] = 2
+        session.save()
+
+    def available(self):
+        return [room.number for room, _, _, _ in self.client.get(reverse('available_rooms')).context['available_rooms_info']]
+
+    def test_second_request_is_a_hit(self):
+        self.assertEqual(self.available(), [1, 2])
+        self.assertEqual(self.available(), [1, 2])
+        self.assertEqual((caching.counters['available_rooms_hits'], caching.counters['available_rooms_misses']), (1, 1))
+
+    def test_booking_invalidates(self):
+        self.available()
+        start = timezone.make_aware(datetime.combine(self.day, datetime.min.time()))
+        CustomEvent.objects.create(calendar=self.rooms[0].calendar, event_type='occupancy', start=start, end=start + timedelta(days=1), title="Booking")
+        self.assertEqual(self.available(), [2])
+        self.assertEqual(caching.counters['available_rooms_hits'], 0)
+
+    def test_preference_change_invalidates(self):
+        self.available()
+        self.owner.preference = Person.Preference.MEMBERS
+        self.owner.save()
+        self.assertEqual(self.available(), [1])
+
+    def test_owner_delete_invalidates(self):
+        self.owner.preference = Person.Preference.MEMBERS
+        self.owner.save()
+        self.assertEqual(self.available(), [1])
+        self.owner.delete()
+        self.assertEqual(self.available(), [1, 2])
+        self.assertEqual(caching.counters['available_rooms_hits'], 0)
+
+    def test_new_room_invalidates(self):
+        self.available()
+        Room.objects.create(number=3, section=self.section, calendar=Calendar.objects.create(slug="cached-3"))
+        self.assertEqual(self.available(), [1, 2, 3])
+
+    def test_bulk_created_rooms_invalidate(self):
+        self.available()
+        create_rooms([Room(number=3, section=self.section)])
+        self.assertEqual(self.available(), [1, 2, 3])
+
+    def test_imported_rooms_invalidate(self):
+        self.available()
+        import_rooms([{'building': "Testbuilding", 'section': "Testsection", 'room': 4}])
+        self.assertEqual(self.available(), [1, 2, 4])
+
+    def test_renumbering_invalidates(self):
+        self.available()
+        self.rooms[0].number = 9
+        self.rooms[0].save()
+        self.assertEqual(self.available(), [2, 9])
+
+    def test_imported_preference_invalidates(self):
+        self.available()
+        # the owner's room is already there, so only the preference changes
+        import_rooms([{'building': "Testbuilding", 'section': "Testsection", 'room': 2, 'owner': "Owner", 'preference': "members"}])
+        self.assertEqual(Person.objects.get(name="Owner").preference, Person.Preference.MEMBERS)
+        self.assertEqual(self.available(), [1])
+
+    def test_only_the_changed_calendar_matters(self):
+        tokens = caching.current_tokens([caching.version_key(1), caching.version_key(2)])
+        caching.store('catalog:test', tokens, ['result'])
+
+        caching.bump_calendars([3])
+        self.assertEqual(caching.cached('test', 'catalog:test'), ['result'])
+        caching.bump_calendars([2])
+        self.assertIsNone(caching.cached('test', 'catalog:test'))
+
+
+class CachedChoicesTest(TestCase):
+
+    def setUp(self):
+        caches[caching.CACHE_ALIAS].clear()
+        caching.counters.clear()
+        self.client.force_login(User.objects.create_superuser(username="admin", password="password"))
+        building = Building.objects.create(name="Testbuilding")
+        self.section = Section.objects.create(name="Testsection", building=building)
+
+    def add(self, rooms, members):
+        for _ in range(rooms):
+            number = Room.objects.count() + 1
+            Room.objects.create(number=number, section=self.section, calendar=Calendar.objects.create(slug=f"choices-{number}"))
+        for _ in range(members):
+            Person.objects.create(name=f"Member {Person.objects.count() + 1}")
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('rooms_master_with_section', args=[self.section.id]))
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_page_cost_independent_of_rooms_and_members(self):
+        self.add(rooms=1, members=1)
+        self.count_queries()
+        small = self.count_queries()
+        self.add(rooms=5, members=5)
+        self.count_queries()
+        self.assertEqual(self.count_queries(), small)
+
+    def test_members_rendered_once(self):
+        self.add(rooms=3, members=1)
+        content = self.client.get(reverse('rooms_master_with_section', args=[self.section.id])).content.decode()
+        self.assertEqual(content.count("Member 1<"), 1)
+        self.assertEqual(content.count("roomless-members-menu\""), 3)
+
+    def test_new_member_invalidates(self):
+        self.add(rooms=1, members=1)
+        self.client.get(reverse('rooms_master_with_section', args=[self.section.id]))
+        Person.objects.create(name="Newcomer")
+        self.assertContains(self.client.get(reverse('rooms_master_with_section', args=[self.section.id])), "Newcomer")
+
+    def test_select_forms_still_validate(self):
+        self.add(rooms=1, members=0)
+        room = Room.objects.get()
+        self.assertEqual(RoomSelectForm().fields['room'].choices, [('', '---------'), (room.id, str(room))])
+        RoomSelectForm()
+        self.assertEqual(caching.counters['choices_hits'], 1)
+
+        response = self.client.post(reverse('rooms_master'), {'room': room.id, 'room_form_submit': 1})
+        self.assertRedirects(response, reverse('rooms_master_with_room', args=[room.id]), fetch_redirect_response=False)
+        self.assertFalse(RoomSelectForm({'room': 0}).is_valid())
@@ -0,0 +1,61 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from catalog.calendars import allocate_slugs, create_rooms
+from catalog.models import Building, CustomEvent, Person, Room, RoomDayStatus, Section
+from schedule.models import Calendar
+
+
+class RoomCalendarTest(TestCase):
+
+    def setUp(self):
+        self.building = Building.objects.create(name="Testbuilding")
+        self.section = Section.objects.create(name="Testsection", building=self.building)
+
+    def test_new_room_gets_one_calendar(self):
+        room = Room.objects.create(number=7, section=self.section)
+
+        self.assertEqual(Calendar.objects.count(), 1)
+        self.assertEqual(room.calendar.slug, "room-7-calendar")
+        self.assertEqual(room.calendar.name, "Room 7 in Testbuilding / Testsection")
+        self.assertEqual(Room.objects.get(pk=room.pk).calendar, room.calendar)
+        self.assertEqual(list(CustomEvent.objects.filter(calendar=room.calendar).values_list('title', flat=True)), ["Permanent Availability"])
+        self.assertTrue(RoomDayStatus.objects.filter(room=room, status=RoomDayStatus.Status.AVAILABLE).exists())
+
+    def test_same_number_twice(self):
+        other = Section.objects.create(name="Othersection", building=self.building)
+        first = Room.objects.create(number=1, section=self.section)
+        second = Room.objects.create(number=1, section=other)
+        self.assertEqual((first.calendar.slug, second.calendar.slug), ("room-1-calendar", "room-1-calendar-1"))
+
+    def test_given_calendar_is_kept_and_named(self):
+        calendar = Calendar.objects.create(slug="mine")
+        room = Room.objects.create(number=1, section=self.section, owner=Person.objects.create(name="Owner"), calendar=calendar)
+
+        self.assertEqual(room.calendar, calendar)
+        self.assertEqual(Calendar.objects.get(pk=calendar.pk).name, "Owner's Calendar")
+        # owners post their own availability
+        self.assertFalse(CustomEvent.objects.filter(calendar=calendar).exists())
+
+    def test_allocate_slugs_in_one_query(self):
+        Calendar.objects.create(slug="room-1-calendar")
+        Calendar.objects.create(slug="room-1-calendar-1")
+        Calendar.objects.create(slug="room-11-calendar")
+        with self.assertNumQueries(1):
+            slugs = allocate_slugs(["room-1-calendar", "room-2-calendar", "room-1-calendar"])
+        self.assertEqual(slugs, ["room-1-calendar-2", "room-2-calendar", "room-1-calendar-3"])
+
+    def test_create_rooms_in_bulk(self):
+        owner = Person.objects.create(name="Owner")
+        rooms = [Room(number=i, section=self.section, owner=owner if i == 0 else None) for i in range(40)]
+
+        with CaptureQueriesContext(connection) as queries:
+            create_rooms(rooms)
+        fixed = [query for query in queries if 'INSERT INTO "catalog_roomdaystatus"' not in query['sql']]
+        self.assertEqual(len(fixed), 16)
+
+        self.assertEqual(Calendar.objects.count(), 40)
+        self.assertEqual(len(set(Room.objects.values_list('calendar', flat=True))), 40)
+        self.assertEqual(CustomEvent.objects.filter(title="Permanent Availability").count(), 39)
+        self.assertEqual(Room.objects.get(number=0).calendar.name, "Owner's Calendar")
+        self.assertEqual(RoomDayStatus.objects.filter(status=RoomDayStatus.Status.AVAILABLE).values('room').distinct().count(), 39)
@@ -0,0 +1,128 @@
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.urls import reverse
+from catalog.models import ArchivedBooking, Building, CustomEvent, Person, Room, Section
+from catalog import room_days
+from catalog.expiry import MAX_BATCH_SIZE, delete_ended_events
+from catalog.utils import bulk_create_custom_events
+from schedule.models import Calendar, Event
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from django.utils import timezone
+
+
+class DeleteEndedEventsTest(TestCase):
+
+    def setUp(self):
+        self.calendar = Calendar.objects.create(slug="expiry")
+        self.cutoff = timezone.make_aware(datetime(2020, 6, 1, 12))
+        start = timezone.make_aware(datetime(2020, 1, 1, 12))
+        events = [
+            CustomEvent(calendar=self.calendar, event_type='occupancy', start=start + timedelta(days=i),
+                        end=start + timedelta(days=i + 1), title=f"Booking {i}")
+            for i in range(7)
+        ]
+        events.append(CustomEvent(calendar=self.calendar, event_type='availability', start=start,
+                                  end=self.cutoff + timedelta(days=1), title="Still going"))
+        bulk_create_custom_events(events)
+
+    def test_deletes_ended_events_in_batches(self):
+        seen = []
+        report = delete_ended_events(cutoff=self.cutoff, batch_size=3, batch_seconds=60, progress=lambda report: seen.append(report['deleted']))
+
+        self.assertTrue(report['finished'])
+        self.assertEqual(report['deleted'], 7)
+        # 3 at a time, doubling after each quick batch
+        self.assertEqual(seen, [3, 7])
+        self.assertEqual(list(CustomEvent.objects.values_list('title', flat=True)), ["Still going"])
+        # parent rows go with them
+        self.assertEqual(Event.objects.count(), 1)
+
+    def test_slow_batches_shrink(self):
+        seen = []
+        # every batch counts as slow, so it halves down to the minimum
+        delete_ended_events(cutoff=self.cutoff, batch_size=200, batch_seconds=0, progress=lambda report: seen.append(report['deleted']))
+        self.assertEqual(seen, [7])
+
+    def test_resumes_from_last_pk(self):
+        first = delete_ended_events(cutoff=self.cutoff, batch_size=2, max_seconds=0)
+        self.assertFalse(first['finished'])
+        self.assertEqual(first['deleted'], 2)
+
+        rest = delete_ended_events(cutoff=self.cutoff, after_pk=first['last_pk'], batch_size=2)
+        self.assertTrue(rest['finished'])
+        self.assertEqual(first['deleted'] + rest['deleted'], 7)
+        self.assertEqual(CustomEvent.objects.count(), 1)
+
+    def test_nothing_to_do(self):
+        report = delete_ended_events(cutoff=self.cutoff - timedelta(days=365))
+        self.assertEqual((report['deleted'], report['batches'], report['finished']), (0, 0, True))
+
+    def test_recent_checkouts_rebuild_each_room_once(self):
+        building = Building.objects.create(name="Testbuilding")
+        section = Section.objects.create(name="Testsection", building=building)
+        rooms = [Room.objects.create(number=i, section=section, calendar=Calendar.objects.create(slug=f"expiry-{i}")) for i in range(2)]
+        # checked out this morning, so still inside the RoomDayStatus horizon
+        end = timezone.make_aware(datetime.combine(timezone.localdate(), datetime.min.time())) + timedelta(hours=11)
+        bulk_create_custom_events([
+            CustomEvent(calendar=rooms[i % 2].calendar, event_type='occupancy', start=end - timedelta(days=2), end=end, title=f"Booking {i}")
+            for i in range(20)
+        ])
+
+        with patch('catalog.room_days.rebuild_room_days', wraps=room_days.rebuild_room_days) as rebuild:
+            report = delete_ended_events(cutoff=end + timedelta(minutes=1), batch_size=MAX_BATCH_SIZE)
+        # setUp's 8 as well
+        self.assertEqual(report['deleted'], 28)
+        self.assertEqual(rebuild.call_count, 1)
+        self.assertEqual(set(rebuild.call_args.args[0]), set(rooms))
+
+
+class ArchiveBookingsTest(TestCase):
+
+    def setUp(self):
+        building = Building.objects.create(name="Testbuilding")
+        section = Section.objects.create(name="Testsection", building=building)
+        self.room = Room.objects.create(number=1, section=section, owner=Person.objects.create(name="Owner"),
+                                        calendar=Calendar.objects.create(slug="archive"))
+        self.host = User.objects.create_user(username="host", password="password")
+        self.cutoff = timezone.make_aware(datetime(2020, 6, 1, 12))
+        start = timezone.make_aware(datetime(2020, 1, 1, 12))
+        bulk_create_custom_events([
+            CustomEvent(calendar=self.room.calendar, event_type='availability', start=start, end=start + timedelta(days=20), title="Availability"),
+            CustomEvent(calendar=self.room.calendar, event_type='occupancy', start=start, end=start + timedelta(days=2),
+                        title="Booking: Guest", guest_name="Guest", guest_type=CustomEvent.GuestType.KNOWN, creator=self.host),
+        ])
+
+    def test_sweep_moves_bookings_into_the_archive(self):
+        booking = CustomEvent.objects.get(event_type='occupancy')
+
+        report = delete_ended_events(cutoff=self.cutoff)
+
+        self.assertEqual((report['deleted'], report['archived']), (2, 1))
+        self.assertFalse(CustomEvent.objects.filter(calendar=self.room.calendar, end__lt=self.cutoff).exists())
+        archived = ArchivedBooking.objects.get()
+        self.assertEqual(archived.event_id, booking.id)
+        self.assertEqual(archived.room, self.room)
+        self.assertEqual(archived.room_name, str(self.room))
+        self.assertEqual(archived.room_owner, "Owner")
+        self.assertEqual((archived.host, archived.host_name), (self.host, "host"))
+        self.assertEqual((archived.guest_name, archived.guest_type), ("Guest", CustomEvent.GuestType.KNOWN))
+        self.assertEqual((archived.start, archived.end), (booking.start, booking.end))
+
+    def test_archive_can_be_skipped(self):
+        report = delete_ended_events(cutoff=self.cutoff, archive=False)
+        self.assertEqual(report['archived'], 0)
+        self.assertFalse(ArchivedBooking.objects.exists())
+
+    def test_history_survives_the_room_and_is_superuser_only(self):
+        delete_ended_events(cutoff=self.cutoff)
+        self.room.delete()
+
+        self.client.force_login(self.host)
+        self.assertEqual(self.client.get(reverse('guest_history')).status_code, 302)
+
+        self.client.force_login(User.objects.create_superuser(username="admin", password="password"))
+        response = self.client.get(reverse('guest_history'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Guest")
+        self.assertContains(response, "Testbuilding / Testsection / 1")
@@ -0,0 +1,72 @@
+import time
+
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.urls import reverse
+from catalog import instrumentation
+from catalog.instrumentation import QueryRecorder, query_shape
+from catalog.models import Building, Section
+
+
+class InstrumentationTest(TestCase):
+
+    def setUp(self):
+        instrumentation.reset()
+        self.addCleanup(instrumentation.reset)
+
+    def test_query_shape(self):
+        self.assertEqual(
+            query_shape("SELECT * FROM room WHERE id IN (%s, %s, %s) AND number = 3 AND name = 'x'"),
+            query_shape("SELECT * FROM room WHERE id IN (%s) AND number = 12 AND name = 'y'"),
+        )
+
+    def test_middleware_records_views(self):
+        self.client.get(reverse('available_rooms'))
+        self.client.get(reverse('available_rooms'))
+
+        stats = instrumentation.snapshot()['available_rooms']
+        self.assertEqual(stats['requests'], 2)
+        self.assertGreater(stats['avg_queries'], 0)
+        self.assertGreaterEqual(stats['max_ms'], stats['avg_sql_ms'])
+
+    @override_settings(INSTRUMENTATION_REPEAT_THRESHOLD=3)
+    def test_flags_repeated_queries(self):
+        building = Building.objects.create(name="Testbuilding")
+        for i in range(5):
+            Section.objects.create(name=f"Section {i}", building=building)
+
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            # the classic: one query for the list, one more per item
+            for section in Section.objects.all():
+                section.building.name
+        self.assertEqual(recorder.count, 6)
+
+        with self.assertLogs('catalog.instrumentation', 'WARNING') as logs:
+            instrumentation.record('sections', 0.01, recorder)
+        self.assertIn("Possible N+1 in sections", logs.output[0])
+
+        stats = instrumentation.snapshot()['sections']
+        self.assertEqual(stats['n_plus_one_requests'], 1)
+        self.assertEqual(stats['repeated_queries'][0]['max_count'], 5)
+        self.assertIn('catalog_building', stats['repeated_queries'][0]['sql'])
+
+    def test_periodic_log_line(self):
+        self.client.get(reverse('available_rooms'))
+        with self.assertLogs('catalog.instrumentation', 'INFO') as logs:
+            instrumentation.maybe_log(now=time.monotonic() + 10 ** 6)
+        self.assertIn("available_rooms 1x", logs.output[0])
+
+    def test_endpoint_is_staff_only(self):
+        self.client.get(reverse('available_rooms'))
+        self.client.force_login(User.objects.create_user(username="member", password="password"))
+        self.assertEqual(self.client.get(reverse('instrumentation_stats')).status_code, 302)
+
+        self.client.force_login(User.objects.create_user(username="staff", password="password", is_staff=True))
+        response = self.client.get(reverse('instrumentation_stats'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('available_rooms', response.json()['views'])
+
+        self.client.post(reverse('instrumentation_stats'))
+        self.assertEqual(list(instrumentation.snapshot()), ['instrumentation_stats'])
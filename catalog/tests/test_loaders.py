@@ -0,0 +1,235 @@
+from django.test import TestCase
+from django.core.cache import caches
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from catalog.models import Person, Building, Section, CustomEvent, Room
+from catalog import caching
+from catalog.loaders import last_available_dates, load_household, load_section_rooms, occupancy_events_for_display
+from catalog.utils import process_occupancy_events
+from catalog.views.main_views import GUESTS_PER_PAGE
+from schedule.models import Calendar
+from datetime import datetime
+from django.utils import timezone
+
+
+def aware(*args):
+    return timezone.make_aware(datetime(*args))
+
+
+class LoaderTestCase(TestCase):
+
+    def setUp(self):
+        # timelines are cached per calendar, start every test cold
+        caches[caching.CACHE_ALIAS].clear()
+        self.building = Building.objects.create(name="Testbuilding")
+        self.section = Section.objects.create(name="Testsection", building=self.building)
+        self.rooms_made = 0
+
+    # owned rooms, so the page's select forms don't grow with the section
+    def make_room(self, section=None, owner=None):
+        self.rooms_made += 1
+        number = self.rooms_made
+        room = Room.objects.create(
+            number=number,
+            section=section or self.section,
+            calendar=Calendar.objects.create(slug=f"test-{number}"),
+            owner=owner or Person.objects.create(name=f"Owner {number}"),
+        )
+        CustomEvent.objects.create(calendar=room.calendar, event_type='availability', start=aware(3000, 1, 1, 12), end=aware(3000, 1, 20, 12), title="Availability")
+        CustomEvent.objects.create(calendar=room.calendar, event_type='occupancy', start=aware(3000, 1, 5, 12), end=aware(3000, 1, 7, 12), title="Booking: Guest")
+        return room
+
+
+class LoadSectionRoomsTest(LoaderTestCase):
+
+    def test_matches_per_room_queries(self):
+        rooms = [self.make_room() for _ in range(3)]
+        section_events = load_section_rooms(self.section)
+
+        self.assertEqual(set(section_events), set(rooms))
+        for room, info in section_events.items():
+            availability_events = CustomEvent.objects.filter(calendar=room.calendar, event_type='availability').order_by('start')
+            occupancy_events = CustomEvent.objects.filter(calendar=room.calendar, event_type='occupancy').order_by('start')
+            self.assertEqual(list(info['availability_events']), list(availability_events))
+            self.assertEqual(info['occupancy_events_and_vacancies'], process_occupancy_events(availability_events, occupancy_events))
+            self.assertTrue(info['events_exist'])
+            self.assertEqual(info['owner_id'], room.owner.id)
+            self.assertEqual(info['room_title'], f"{room.owner}'s Room")
+            self.assertEqual(info['room_name'], str(room))
+
+    def test_query_count_independent_of_section_size(self):
+        small = Section.objects.create(name="Small", building=self.building)
+        self.make_room(section=small)
+        for _ in range(8):
+            self.make_room()
+
+        # rooms, events
+        with self.assertNumQueries(2):
+            self.assertEqual(len(load_section_rooms(small)), 1)
+        with self.assertNumQueries(2):
+            section_events = load_section_rooms(self.section)
+            # rendering bits that used to be lazy
+            for room, info in section_events.items():
+                str(room), room.owner.preference, room.is_offline
+        self.assertEqual(len(section_events), 8)
+
+    def test_unchanged_rooms_come_from_the_cache(self):
+        rooms = [self.make_room() for _ in range(4)]
+        first = load_section_rooms(self.section)
+
+        # just the rooms
+        with self.assertNumQueries(1):
+            self.assertEqual(load_section_rooms(self.section), first)
+
+        # one room changes, only its events are loaded
+        booking = CustomEvent.objects.create(calendar=rooms[0].calendar, event_type='occupancy', start=aware(3000, 1, 10, 12), end=aware(3000, 1, 12, 12), title="Booking: Another")
+        with CaptureQueriesContext(connection) as queries:
+            section_events = load_section_rooms(self.section)
+        self.assertEqual(len(queries), 2)
+        self.assertIn(f"IN ({rooms[0].calendar_id})", queries[1]['sql'])
+        self.assertIn(booking, [block.get('event') for block in section_events[rooms[0]]['occupancy_events_and_vacancies']])
+        self.assertEqual(section_events[rooms[1]], first[rooms[1]])
+
+
+class RoomsMasterSectionViewTest(LoaderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_superuser(username="admin", password="password")
+        self.client.force_login(self.admin)
+
+    # cold, so neither page gets the other's cached select lists
+    def count_queries(self, section):
+        caches[caching.CACHE_ALIAS].clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('rooms_master_with_section', args=[section.id]))
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_query_count_independent_of_section_size(self):
+        small = Section.objects.create(name="Small", building=self.building)
+        self.make_room(section=small)
+        for _ in range(6):
+            self.make_room()
+
+        self.assertEqual(self.count_queries(small), self.count_queries(self.section))
+
+    def test_only_changed_room_cards_rerender(self):
+        alpha, beta = self.make_room(), self.make_room()
+        CustomEvent.objects.create(calendar=alpha.calendar, event_type='occupancy', start=aware(3000, 1, 2, 12), end=aware(3000, 1, 4, 12), title="Booking: Alpha")
+        booking = CustomEvent.objects.create(calendar=beta.calendar, event_type='occupancy', start=aware(3000, 1, 2, 12), end=aware(3000, 1, 4, 12), title="Booking: Beta")
+        url = reverse('rooms_master_with_section', args=[self.section.id])
+        self.assertContains(self.client.get(url), "Alpha")
+
+        # behind the signals' back, and without the cached timelines, only the rendered card remembers
+        CustomEvent.objects.filter(title="Booking: Alpha").update(title="Booking: Gamma")
+        caches[caching.CACHE_ALIAS].delete_many([caching.timeline_key(alpha.calendar_id), caching.timeline_key(beta.calendar_id)])
+        booking.title = "Booking: Delta"
+        booking.save()
+
+        response = self.client.get(url)
+        self.assertContains(response, "Alpha")
+        self.assertContains(response, "Delta")
+        self.assertNotContains(response, "Beta")
+
+
+class LoadHouseholdTest(LoaderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.parent = Person.objects.create(name="Parent")
+        self.parent_room = self.make_room(owner=self.parent)
+
+    def add_children(self, count):
+        return [self.make_room(owner=Person.objects.create(name=f"Child {i}", parent=self.parent)) for i in range(count)]
+
+    def test_by_person_and_by_room(self):
+        child_rooms = self.add_children(2)
+        by_person = load_household(person=self.parent)
+        by_room = load_household(room_id=self.parent_room.id)
+
+        for household in (by_person, by_room):
+            self.assertEqual(household['room'], self.parent_room)
+            self.assertEqual(household['children'], [room.owner for room in child_rooms])
+            self.assertEqual(set(household['children_info']), {room.owner for room in child_rooms})
+            self.assertTrue(household['room_info']['events_exist'])
+
+    def test_no_room(self):
+        self.assertIsNone(load_household(person=Person.objects.create(name="Roomless")))
+        self.assertIsNone(load_household(room_id=12345))
+
+    def test_query_count_independent_of_children(self):
+        with self.assertNumQueries(2):
+            load_household(person=self.parent)
+        self.add_children(4)
+        with self.assertNumQueries(2):
+            household = load_household(person=self.parent)
+        self.assertEqual(len(household['children_info']), 4)
+
+    def test_my_room_and_rooms_master_render_children(self):
+        self.add_children(2)
+        user = User.objects.create_superuser(username="parent", password="password")
+        self.parent.user = user
+        self.parent.save()
+        self.client.force_login(user)
+
+        response = self.client.get(reverse('my_room'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['children_info']), 2)
+
+        response = self.client.get(reverse('rooms_master_with_room', args=[self.parent_room.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['children_info']), 2)
+        self.assertEqual(response.context['room'], self.parent_room)
+
+
+class GuestListingsTest(LoaderTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.host = User.objects.create_user(username="host", password="password")
+        self.client.force_login(self.host)
+
+    def add_bookings(self, count):
+        for _ in range(count):
+            room = self.make_room()
+            CustomEvent.objects.create(calendar=room.calendar, event_type='occupancy', start=aware(3000, 1, 10, 12),
+                                       end=aware(3000, 1, 12, 12), title="Booking: Guest", guest_name="Guest", creator=self.host)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_last_available_dates_match_room_method(self):
+        self.add_bookings(3)
+        events = list(occupancy_events_for_display())
+
+        with self.assertNumQueries(1):
+            batched = last_available_dates(events)
+        for event in events:
+            self.assertEqual(batched[event.id], event.calendar.room.get_last_available_date(event.end))
+
+    def test_query_counts_independent_of_bookings(self):
+        self.add_bookings(1)
+        my_guests_small = self.count_queries(reverse('my_guests'))
+        all_guests_small = self.count_queries(reverse('all_guests'))
+
+        self.add_bookings(5)
+        self.assertEqual(self.count_queries(reverse('my_guests')), my_guests_small)
+        self.assertEqual(self.count_queries(reverse('all_guests')), all_guests_small)
+
+    def test_all_guests_paginated(self):
+        calendar = self.make_room().calendar
+        for day in range(GUESTS_PER_PAGE + 5):
+            CustomEvent.objects.create(calendar=calendar, event_type='occupancy', start=aware(3000, 1, 1 + day % 28, 12),
+                                       end=aware(3000, 1, 1 + day % 28, 13), title="Booking", guest_name=f"Guest {day}")
+
+        response = self.client.get(reverse('all_guests'))
+        self.assertEqual(len(response.context['occupancy_events']), GUESTS_PER_PAGE)
+        response = self.client.get(reverse('all_guests') + '?page=2')
+        # plus the booking make_room adds
+        self.assertEqual(len(response.context['occupancy_events']), 6)
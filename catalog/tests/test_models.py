@@ -525,3 +525,57 @@ class CustomEventModelTest(TestCase):
                 ['Value 99 is not a valid choice.']
             )
             
+
+
+class TracksFieldChangesTest(TestCase):
+
+    def setUp(self):
+        self.building = Building.objects.create(name="Testbuilding")
+        self.section = Section.objects.create(name="Testsection", building=self.building)
+        self.room = Room.objects.create(number=1, section=self.section, calendar=Calendar.objects.create(slug="tracked"))
+        self.room = Room.objects.get(pk=self.room.pk)
+
+    def test_tracks_changes_since_load(self):
+        self.assertFalse(self.room.has_changed('owner', 'is_offline'))
+        self.room.is_offline = True
+        self.assertTrue(self.room.has_changed('is_offline'))
+        self.assertFalse(self.room.has_changed('owner'))
+
+        self.room.save()
+        self.assertFalse(self.room.has_changed('is_offline'))
+
+    def test_deferred_fields_count_as_changed(self):
+        room = Room.objects.only('id').get(pk=self.room.pk)
+        self.assertTrue(room.has_changed('owner'))
+
+    def test_saving_an_untracked_field_skips_the_signals(self):
+        self.room.number = 2
+        # just the update, no re-fetch, no calendar work, no RoomDayStatus rebuild
+        with self.assertNumQueries(1):
+            self.room.save()
+
+    def test_section_save_does_not_refetch(self):
+        section = Section.objects.get(pk=self.section.pk)
+        section.name = "Renamed"
+        with self.assertNumQueries(1):
+            section.save()
+
+    def test_owner_change_keeps_availability(self):
+        # the permanent availability and its bookings stay put, nobody gets displaced
+        availability = CustomEvent.objects.get(calendar=self.room.calendar, event_type='availability')
+        booking = CustomEvent.objects.create(calendar=self.room.calendar, event_type='occupancy', start=availability.start, end=availability.start + timedelta(days=2), title="Booking")
+        name = self.room.calendar.name
+        self.room.owner = Person.objects.create(name="Newowner")
+        self.room.save()
+
+        self.assertEqual(list(CustomEvent.objects.filter(calendar=self.room.calendar).order_by('pk')), [availability, booking])
+        self.assertEqual(Calendar.objects.get(pk=self.room.calendar_id).name, name)
+
+    def test_owner_change_without_calendar(self):
+        self.room.calendar.delete()
+        room = Room.objects.get(pk=self.room.pk)
+        room.owner = Person.objects.create(name="Newowner")
+        room.save()
+        room.owner = None
+        room.save()
+        self.assertFalse(CustomEvent.objects.filter(calendar__isnull=True).exists())
@@ -0,0 +1,95 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from catalog.models import Building, CustomEvent, Person, Room, RoomDayStatus, Section
+from catalog.room_days import horizon
+from schedule.models import Calendar
+from datetime import datetime, timedelta
+from django.utils import timezone
+
+
+class OfflineCascadeTest(TestCase):
+
+    def setUp(self):
+        self.building = Building.objects.create(name="Testbuilding")
+        self.sections = [Section.objects.create(name=f"Section {i}", building=self.building) for i in range(2)]
+        self.rooms = []
+        for i in range(6):
+            owner = Person.objects.create(name=f"Owner {i}") if i % 2 else None
+            self.rooms.append(Room.objects.create(number=i, section=self.sections[i % 2], owner=owner,
+                                                  calendar=Calendar.objects.create(slug=f"offline-{i}")))
+
+        first, _ = horizon()
+        start = timezone.make_aware(datetime.combine(first, datetime.min.time())) + timedelta(hours=12)
+        for room in self.rooms:
+            if room.owner:
+                CustomEvent.objects.create(calendar=room.calendar, event_type='availability', start=start, end=start + timedelta(days=10), title="Away")
+            CustomEvent.objects.create(calendar=room.calendar, event_type='occupancy', start=start, end=start + timedelta(days=2), title="Booking")
+
+    def statuses(self, status):
+        return RoomDayStatus.objects.filter(status=status).values('room').distinct().count()
+
+    def test_building_offline_cascades(self):
+        self.building.is_offline = True
+        self.building.save()
+
+        self.assertFalse(Section.objects.filter(is_offline=False).exists())
+        self.assertFalse(Room.objects.filter(is_offline=False).exists())
+        # owners' availability is gone, ownerless rooms keep a permanent one, bookings are left alone
+        availability = CustomEvent.objects.filter(calendar__room__isnull=False, event_type='availability')
+        self.assertEqual(set(availability.values_list('title', flat=True)), {"Permanent Availability"})
+        self.assertEqual(availability.count(), 3)
+        self.assertEqual(CustomEvent.objects.filter(event_type='occupancy').count(), 6)
+        # every room's nights are offline
+        self.assertEqual(self.statuses(RoomDayStatus.Status.OFFLINE), 6)
+        self.assertEqual(RoomDayStatus.objects.exclude(status=RoomDayStatus.Status.OFFLINE).count(), 0)
+
+    def test_building_back_online(self):
+        self.building.is_offline = True
+        self.building.save()
+        self.building.is_offline = False
+        self.building.save()
+
+        self.assertFalse(Room.objects.filter(is_offline=True).exists())
+        self.assertEqual(RoomDayStatus.objects.filter(status=RoomDayStatus.Status.OFFLINE).count(), 0)
+        # ownerless rooms are available again, owners have to post new availability
+        for room in self.rooms:
+            expected = RoomDayStatus.Status.UNAVAILABLE if room.owner else RoomDayStatus.Status.AVAILABLE
+            self.assertTrue(RoomDayStatus.objects.filter(room=room, status=expected).exists())
+
+    def test_section_offline_leaves_the_rest(self):
+        section = self.sections[0]
+        section.is_offline = True
+        section.save()
+
+        self.assertEqual(set(Room.objects.filter(is_offline=True)), set(section.rooms.all()))
+        self.assertFalse(CustomEvent.objects.filter(calendar__room__section=section, title="Away").exists())
+        self.assertTrue(CustomEvent.objects.filter(calendar__room__section=self.sections[1], title="Away").exists())
+        self.assertEqual(self.statuses(RoomDayStatus.Status.OFFLINE), 3)
+
+    def test_query_count_does_not_grow_with_rooms(self):
+        for i in range(6, 30):
+            Room.objects.create(number=i, section=self.sections[i % 2], calendar=Calendar.objects.create(slug=f"offline-{i}"))
+
+        self.building.is_offline = True
+        with CaptureQueriesContext(connection) as queries:
+            self.building.save()
+        self.assertEqual(self.statuses(RoomDayStatus.Status.OFFLINE), 30)
+        # only the RoomDayStatus insert is batched by size, everything else is a fixed handful
+        fixed = [query for query in queries if 'INSERT INTO "catalog_roomdaystatus"' not in query['sql']]
+        self.assertEqual(len(fixed), 26)
+
+    def test_section_query_count_does_not_grow_with_rooms(self):
+        def toggle(section):
+            section.is_offline = True
+            with CaptureQueriesContext(connection) as queries:
+                section.save()
+            return len([query for query in queries if 'INSERT INTO "catalog_roomdaystatus"' not in query['sql']])
+
+        # same fixed handful as the building, the RoomDayStatus insert aside
+        self.assertEqual(toggle(self.sections[0]), 24)
+        for i in range(6, 30):
+            owner = Person.objects.create(name=f"Owner {i}") if i % 2 else None
+            Room.objects.create(number=i, section=self.sections[1], owner=owner, calendar=Calendar.objects.create(slug=f"offline-{i}"))
+        self.assertEqual(toggle(self.sections[1]), 24)
+        self.assertEqual(self.statuses(RoomDayStatus.Status.OFFLINE), 30)
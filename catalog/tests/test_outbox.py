@@ -0,0 +1,111 @@
+from django.test import TestCase
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from catalog.models import OutboxEmail
+from catalog.outbox import MAX_ATTEMPTS, queue_emails, retry_delay, send_outbox
+from datetime import timedelta
+from django.utils import timezone
+
+
+# locmem backend that counts how often it's opened and refuses one address
+class FlakyBackend(EmailBackend):
+
+    def __init__(self, *args, refuse=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.refuse = refuse
+        self.opened = 0
+
+    def open(self):
+        self.opened += 1
+
+    def send_messages(self, messages):
+        for message in messages:
+            if self.refuse in message.to:
+                raise ConnectionError("mailbox unavailable")
+        return super().send_messages(messages)
+
+
+class SendOutboxTest(TestCase):
+
+    def test_one_digest_per_recipient_over_one_connection(self):
+        queue_emails([
+            ("host@example.com", "Your room booking has changed", "First change"),
+            ("other@example.com", "Your room booking has changed", "Only change"),
+            ("host@example.com", "Your room booking has changed", "Second change"),
+        ])
+        connection = FlakyBackend()
+
+        report = send_outbox(connection=connection)
+
+        self.assertEqual(report, {'sent': 3, 'digests': 2, 'failed': 0})
+        self.assertEqual(connection.opened, 1)
+        by_recipient = {message.to[0]: message for message in mail.outbox}
+        self.assertEqual(by_recipient["other@example.com"].body, "Only change")
+        self.assertIn("First change", by_recipient["host@example.com"].body)
+        self.assertIn("Second change", by_recipient["host@example.com"].body)
+        self.assertIn("2 updates", by_recipient["host@example.com"].subject)
+        self.assertFalse(OutboxEmail.objects.filter(sent_on__isnull=True).exists())
+
+        # nothing left to send
+        self.assertEqual(send_outbox(connection=connection)['digests'], 0)
+
+    def test_failed_recipient_backs_off_and_retries(self):
+        queue_emails([
+            ("host@example.com", "Subject", "Body"),
+            ("broken@example.com", "Subject", "Body"),
+        ])
+        now = timezone.now()
+
+        report = send_outbox(now=now, connection=FlakyBackend(refuse="broken@example.com"))
+
+        self.assertEqual(report, {'sent': 1, 'digests': 1, 'failed': 1})
+        failed = OutboxEmail.objects.get(recipient="broken@example.com")
+        self.assertEqual(failed.attempts, 1)
+        self.assertEqual(failed.next_attempt, now + retry_delay(1))
+        self.assertIn("mailbox unavailable", failed.last_error)
+
+        # not due yet
+        self.assertEqual(send_outbox(now=now, connection=FlakyBackend())['digests'], 0)
+        # due, and the server is happy now
+        self.assertEqual(send_outbox(now=now + retry_delay(1), connection=FlakyBackend())['sent'], 1)
+
+    def test_gives_up_after_max_attempts(self):
+        queue_emails([("broken@example.com", "Subject", "Body")])
+        now = timezone.now()
+        for _ in range(MAX_ATTEMPTS):
+            send_outbox(now=now, connection=FlakyBackend(refuse="broken@example.com"))
+            now += timedelta(days=1)
+
+        self.assertEqual(OutboxEmail.objects.get().attempts, MAX_ATTEMPTS)
+        self.assertEqual(send_outbox(now=now, connection=FlakyBackend())['digests'], 0)
+
+    def test_overlapping_runs_send_once(self):
+        queue_emails([
+            ("host@example.com", "Subject", "Body"),
+            ("other@example.com", "Subject", "Body"),
+        ])
+        overlapping = []
+
+        # a slow server: another run starts while the first is still sending
+        class SlowBackend(FlakyBackend):
+            def send_messages(self, messages):
+                if not overlapping:
+                    overlapping.append(send_outbox(connection=FlakyBackend()))
+                return super().send_messages(messages)
+
+        report = send_outbox(connection=SlowBackend())
+
+        self.assertEqual(report['digests'], 2)
+        self.assertEqual(overlapping, [{'sent': 0, 'digests': 0, 'failed': 0}])
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_unreachable_server_hands_emails_back(self):
+        queue_emails([("host@example.com", "Subject", "Body")])
+
+        class DownBackend(FlakyBackend):
+            def open(self):
+                raise ConnectionRefusedError("no server")
+
+        with self.assertRaises(ConnectionRefusedError):
+            send_outbox(connection=DownBackend())
+        self.assertEqual(send_outbox(connection=FlakyBackend())['sent'], 1)
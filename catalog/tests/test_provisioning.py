@@ -0,0 +1,85 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from catalog.models import Building, CustomEvent, Person, Room, RoomDayStatus, Section
+from catalog.provisioning import ImportFileError, import_rooms, read_rows
+from schedule.models import Calendar
+
+
+CSV = """building,area,section,room,owner,preference,offline
+Main,courtyard,Upstairs,1,Ann,known,
+Main,courtyard,Upstairs,2,,,
+Main,courtyard,Downstairs,1,Bob,members,yes
+Barn,not_courtyard,Loft,1,,,
+"""
+
+
+class ImportRoomsTest(TestCase):
+
+    def write(self, content, suffix):
+        f = tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False)
+        f.write(content)
+        f.close()
+        self.addCleanup(os.remove, f.name)
+        return f.name
+
+    def test_csv_import(self):
+        out = StringIO()
+        call_command('import_rooms', self.write(CSV, '.csv'), stdout=out)
+
+        self.assertIn("Imported 4 rows", out.getvalue())
+        self.assertEqual(Building.objects.count(), 2)
+        self.assertEqual(Section.objects.count(), 3)
+        self.assertEqual(Room.objects.count(), 4)
+        self.assertEqual(Calendar.objects.count(), 4)
+
+        ann = Person.objects.get(name="Ann")
+        self.assertEqual(ann.preference, Person.Preference.KNOWN)
+        self.assertEqual(ann.room.section.name, "Upstairs")
+        self.assertEqual(ann.room.calendar.name, "Ann's Calendar")
+        self.assertTrue(Room.objects.get(owner__name="Bob").is_offline)
+        # ownerless rooms start out available
+        self.assertEqual(CustomEvent.objects.filter(title="Permanent Availability").count(), 2)
+        self.assertTrue(RoomDayStatus.objects.filter(room__section__name="Loft", status=RoomDayStatus.Status.AVAILABLE).exists())
+
+    def test_json_import_and_rerun(self):
+        data = [{"name": "Main", "area": "courtyard", "sections": [
+            {"name": "Upstairs", "rooms": [{"number": 1, "owner": "Ann", "preference": "known"}, {"number": 2}]},
+        ]}]
+        path = self.write(json.dumps(data), '.json')
+        call_command('import_rooms', path, stdout=StringIO())
+
+        data[0]["sections"][0]["rooms"].append({"number": 3})
+        data[0]["sections"][0]["rooms"][0]["preference"] = "members"
+        path = self.write(json.dumps(data), '.json')
+        report = import_rooms(read_rows(path))
+
+        self.assertEqual((report['buildings'], report['sections'], report['rooms'], report['skipped']), (0, 0, 1, 2))
+        self.assertEqual(report['preferences'], 1)
+        self.assertEqual(Room.objects.count(), 3)
+        # the preference change reaches RoomDayStatus the way the Person signal would
+        self.assertFalse(RoomDayStatus.objects.filter(room__owner__name="Ann").exclude(min_guest_type=Person.Preference.MEMBERS).exists())
+
+    def test_bad_rows_import_nothing(self):
+        Room.objects.create(number=9, section=Section.objects.create(name="Old", building=Building.objects.create(name="Old")),
+                            owner=Person.objects.create(name="Ann"))
+        with self.assertRaises(CommandError):
+            call_command('import_rooms', self.write(CSV, '.csv'), stdout=StringIO())
+        with self.assertRaises(ImportFileError):
+            import_rooms([{'building': "Main", 'section': "Upstairs", 'room': "one"}])
+        self.assertEqual(Room.objects.count(), 1)
+
+    def test_query_count_does_not_grow_with_rooms(self):
+        rows = [{'building': "Main", 'section': f"Section {i % 4}", 'room': i, 'owner': f"Owner {i}" if i % 2 else ""} for i in range(200)]
+        with CaptureQueriesContext(connection) as queries:
+            import_rooms(rows)
+        fixed = [query for query in queries if 'INSERT INTO "catalog_roomdaystatus"' not in query['sql']]
+        self.assertEqual(len(fixed), 27)
+        self.assertEqual(Room.objects.count(), 200)
@@ -0,0 +1,180 @@
+from django.test import TestCase
+from catalog.models import Person, Building, Section, CustomEvent, Room, RoomDayStatus
+from catalog.availability import find_available_rooms
+from catalog.room_days import find_available_rooms_by_day, horizon, refresh_room_days
+from catalog.utils import date_to_aware_datetime
+from schedule.models import Calendar
+from datetime import timedelta
+import random
+from importlib import import_module
+
+
+class RoomDaysTestCase(TestCase):
+
+    def setUp(self):
+        self.building = Building.objects.create(name="Testbuilding")
+        self.section = Section.objects.create(name="Testsection", building=self.building)
+        self.today = horizon()[0] + timedelta(days=1)
+        self.rooms_made = 0
+
+    def make_room(self, owner=None):
+        self.rooms_made += 1
+        return Room.objects.create(
+            number=self.rooms_made,
+            section=self.section,
+            calendar=Calendar.objects.create(slug=f"test-{self.rooms_made}"),
+            owner=owner or Person.objects.create(name=f"Owner {self.rooms_made}"),
+        )
+
+    # same times the views use, availabilities 12:01 -> 11:59 and bookings 12:01 -> 11:59
+    def add_event(self, room, event_type, first_day, last_day):
+        return CustomEvent.objects.create(
+            calendar=room.calendar,
+            event_type=event_type,
+            start=date_to_aware_datetime(self.today + timedelta(days=first_day), 12, 1),
+            end=date_to_aware_datetime(self.today + timedelta(days=last_day), 11, 59),
+        )
+
+    def status(self, room, day):
+        return RoomDayStatus.objects.get(room=room, day=self.today + timedelta(days=day)).status
+
+    def rooms(self):
+        return Room.objects.select_related('section__building', 'owner').order_by('number')
+
+    def search(self, first_day, last_day, guest_type):
+        start_day, end_day = self.today + timedelta(days=first_day), self.today + timedelta(days=last_day)
+        return find_available_rooms_by_day(self.rooms(), start_day, end_day, guest_type)
+
+
+class RoomDayMaintenanceTest(RoomDaysTestCase):
+
+    def test_follows_events_room_and_owner(self):
+        room = self.make_room()
+        self.assertEqual(self.status(room, 5), RoomDayStatus.Status.UNAVAILABLE)
+
+        self.add_event(room, 'availability', 2, 20)
+        self.assertEqual(self.status(room, 5), RoomDayStatus.Status.AVAILABLE)
+        self.assertEqual(RoomDayStatus.objects.get(room=room, day=self.today + timedelta(days=5)).available_until,
+                         date_to_aware_datetime(self.today + timedelta(days=20), 11, 59))
+
+        booking = self.add_event(room, 'occupancy', 4, 7)
+        self.assertEqual(self.status(room, 5), RoomDayStatus.Status.BOOKED)
+        self.assertEqual(self.status(room, 7), RoomDayStatus.Status.AVAILABLE)
+
+        booking.delete()
+        self.assertEqual(self.status(room, 5), RoomDayStatus.Status.AVAILABLE)
+
+        room.owner.preference = Person.Preference.MEMBERS
+        room.owner.save()
+        self.assertFalse(RoomDayStatus.objects.filter(room=room).exclude(min_guest_type=Person.Preference.MEMBERS).exists())
+
+        room.is_offline = True
+        room.save()
+        self.assertEqual(self.status(room, 5), RoomDayStatus.Status.OFFLINE)
+
+    def test_owner_delete_opens_the_room(self):
+        room = self.make_room(owner=Person.objects.create(name="Picky", preference=Person.Preference.MEMBERS))
+        self.add_event(room, 'availability', 1, 30)
+        self.assertEqual(self.search(5, 9, 1), [])
+
+        room.owner.delete()
+        self.assertEqual([room for room, _ in self.search(5, 9, 1)], [room])
+        self.assertEqual([room for room, _ in find_available_rooms(self.rooms(), date_to_aware_datetime(self.today + timedelta(days=5), 23, 59),
+                                                                   date_to_aware_datetime(self.today + timedelta(days=9), 11, 59), 1)], [room])
+
+    def test_covers_the_horizon(self):
+        room = self.make_room()
+        first_day, last_day = horizon()
+        days = RoomDayStatus.objects.filter(room=room).values_list('day', flat=True)
+        self.assertEqual(min(days), first_day)
+        self.assertEqual(max(days), last_day)
+        self.assertEqual(len(days), (last_day - first_day).days + 1)
+
+    def test_calendar_delete_clears_rows(self):
+        room = self.make_room()
+        self.add_event(room, 'availability', 2, 20)
+        room.calendar.delete()
+        self.assertFalse(RoomDayStatus.objects.filter(room=room).exists())
+
+    def test_refresh_prunes_past_days(self):
+        room = self.make_room()
+        RoomDayStatus.objects.create(room=room, day=self.today - timedelta(days=30), status=RoomDayStatus.Status.AVAILABLE)
+        RoomDayStatus.objects.filter(room=room, day=horizon()[1]).delete()
+
+        self.assertEqual(refresh_room_days(), 1)
+        self.assertEqual(RoomDayStatus.objects.filter(room=room).order_by('day').first().day, horizon()[0])
+        self.assertTrue(RoomDayStatus.objects.filter(room=room, day=horizon()[1]).exists())
+
+
+class FindAvailableRoomsByDayTest(RoomDaysTestCase):
+
+    # merged availabilities with noon to noon bookings inside, the shapes the views produce
+    def random_room(self, rng):
+        room = self.make_room(owner=Person.objects.create(name="Owner", preference=rng.choice(Person.Preference.values)))
+        day = rng.randint(-3, 10)
+        while day < 80:
+            length = rng.randint(2, 25)
+            self.add_event(room, 'availability', day, day + length)
+            booking_day = day + rng.randint(0, length - 1)
+            while booking_day < day + length - 1:
+                nights = rng.randint(1, 4)
+                self.add_event(room, 'occupancy', booking_day, min(booking_day + nights, day + length))
+                booking_day += nights + rng.randint(0, 6)
+            day += length + rng.randint(1, 8)
+        if rng.random() < 0.1:
+            room.is_offline = True
+            room.save()
+        return room
+
+    def test_matches_event_search(self):
+        rng = random.Random(0)
+        for _ in range(8):
+            self.random_room(rng)
+
+        found = 0
+        for _ in range(60):
+            first_day = rng.randint(-1, 85)
+            last_day = first_day + rng.randint(1, 88 - first_day)
+            guest_type = rng.randint(1, 3)
+            with self.subTest(first_day=first_day, last_day=last_day, guest_type=guest_type):
+                expected = find_available_rooms(
+                    self.rooms(),
+                    date_to_aware_datetime(self.today + timedelta(days=first_day), 23, 59),
+                    date_to_aware_datetime(self.today + timedelta(days=last_day), 11, 59),
+                    guest_type,
+                )
+                self.assertEqual(self.search(first_day, last_day, guest_type), expected)
+                found += len(expected)
+        # make sure the data actually had free rooms in it
+        self.assertGreater(found, 0)
+
+    def test_fixed_query_count(self):
+        for _ in range(10):
+            self.add_event(self.make_room(), 'availability', 1, 30)
+
+        # the "is the table filled" check and the search itself
+        with self.assertNumQueries(2):
+            self.assertEqual(len(self.search(5, 9, 1)), 10)
+
+    def test_leaves_what_it_cant_answer_to_the_caller(self):
+        self.add_event(self.make_room(), 'availability', 1, 30)
+        # same day, before the horizon, past it
+        self.assertIsNone(self.search(5, 5, 1))
+        self.assertIsNone(self.search(-5, 3, 1))
+        self.assertIsNone(self.search(80, 100, 1))
+
+        RoomDayStatus.objects.all().delete()
+        self.assertIsNone(self.search(5, 9, 1))
+
+    def test_one_rooms_rows_are_not_a_filled_table(self):
+        rooms = [self.make_room() for _ in range(3)]
+        for room in rooms:
+            self.add_event(room, 'availability', 1, 30)
+        # migrated onto a live site: nothing in the table, then one room's events change
+        RoomDayStatus.objects.all().delete()
+        self.add_event(rooms[0], 'occupancy', 20, 22)
+        self.assertIsNone(self.search(5, 9, 1))
+
+        # the migration's backfill
+        import_module('catalog.migrations.0030_roomdaystatus').backfill_room_days(None, None)
+        self.assertEqual([room for room, _ in self.search(5, 9, 1)], rooms)
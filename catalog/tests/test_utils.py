@@ -0,0 +1,285 @@
+from django.test import TestCase, SimpleTestCase
+from django.contrib.auth.models import User
+from django.core import mail
+from django.urls import reverse
+from catalog.models import Building, CustomEvent, OutboxEmail, Room, Section
+from catalog.outbox import send_outbox
+from catalog.intervals import IntervalIndex, CalendarIndex
+from catalog.utils import (bulk_create_custom_events, displaced_fragment, plan_reassignments,
+                           process_occupancy_events, merge_overlapping_availabilities, reassign_displaced_bookings)
+from schedule.models import Calendar, Event
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from django.utils import timezone
+import random
+
+
+class BulkCreateCustomEventsTest(TestCase):
+
+    def setUp(self):
+        self.calendar = Calendar.objects.create(slug="bulk")
+        self.user = User.objects.create(username="host")
+
+    def test_creates_parent_and_child_rows(self):
+        start = datetime(3000, 1, 1, 12, 0)
+        events = [
+            CustomEvent(calendar=self.calendar, event_type='occupancy', start=start + timedelta(days=i),
+                        end=start + timedelta(days=i + 1), title=f"Booking {i}", creator=self.user,
+                        guest_name=f"Guest {i}", guest_type=CustomEvent.GuestType.KNOWN)
+            for i in range(5)
+        ]
+
+        # one insert per table, plus the savepoint pair from transaction.atomic
+        with self.assertNumQueries(4):
+            created = bulk_create_custom_events(events)
+
+        self.assertEqual(Event.objects.count(), 5)
+        self.assertEqual(CustomEvent.objects.count(), 5)
+        for event in created:
+            self.assertIsNotNone(event.pk)
+            self.assertTrue(timezone.is_aware(event.start))
+            stored = CustomEvent.objects.get(pk=event.pk)
+            self.assertEqual(stored.guest_name, event.guest_name)
+            self.assertEqual(stored.guest_type, CustomEvent.GuestType.KNOWN)
+            self.assertEqual(stored.creator, self.user)
+            self.assertEqual(stored.start, event.start)
+
+
+
+class MergeOverlappingAvailabilitiesTest(TestCase):
+
+    def setUp(self):
+        self.calendar = Calendar.objects.create(slug="merge")
+
+    def add_availability(self, start, end):
+        return CustomEvent.objects.create(calendar=self.calendar, event_type='availability',
+                                          start=timezone.make_aware(start), end=timezone.make_aware(end))
+
+    def test_merges_overlapping_and_same_day_events(self):
+        first = self.add_availability(datetime(3000, 1, 1, 12, 1), datetime(3000, 1, 5, 11, 59))
+        # starts the day the first one ends, so it merges
+        second = self.add_availability(datetime(3000, 1, 5, 12, 1), datetime(3000, 1, 9, 11, 59))
+        # inside the merged range, absorbed without extending anything
+        third = self.add_availability(datetime(3000, 1, 6, 12, 1), datetime(3000, 1, 7, 11, 59))
+        separate = self.add_availability(datetime(3000, 1, 20, 12, 1), datetime(3000, 1, 25, 11, 59))
+
+        summary = merge_overlapping_availabilities(self.calendar)
+
+        self.assertEqual(summary['updated'], [first.id])
+        self.assertEqual(sorted(summary['deleted']), sorted([second.id, third.id]))
+        self.assertEqual([event.id for event in summary['events']], [first.id, separate.id])
+
+        remaining = CustomEvent.objects.filter(calendar=self.calendar).order_by('start')
+        self.assertEqual([event.id for event in remaining], [first.id, separate.id])
+        self.assertEqual(remaining[0].end, timezone.make_aware(datetime(3000, 1, 9, 11, 59)))
+
+    def test_nothing_to_merge_writes_nothing(self):
+        self.add_availability(datetime(3000, 1, 1, 12, 1), datetime(3000, 1, 5, 11, 59))
+        self.add_availability(datetime(3000, 1, 10, 12, 1), datetime(3000, 1, 15, 11, 59))
+
+        # just the read
+        with self.assertNumQueries(1):
+            summary = merge_overlapping_availabilities(self.calendar)
+        self.assertEqual(summary['updated'], [])
+        self.assertEqual(summary['deleted'], [])
+
+    def test_with_prebuilt_index(self):
+        first = self.add_availability(datetime(3000, 1, 1, 12, 1), datetime(3000, 1, 5, 11, 59))
+        second = self.add_availability(datetime(3000, 1, 3, 12, 1), datetime(3000, 1, 9, 11, 59))
+        index = CalendarIndex.for_calendar(self.calendar)
+
+        summary = merge_overlapping_availabilities(self.calendar, index=index)
+
+        self.assertEqual(summary['deleted'], [second.id])
+        self.assertEqual(list(index.availability), [first])
+        self.assertFalse(CustomEvent.objects.filter(id=second.id).exists())
+
+class ReassignDisplacedBookingsTest(TestCase):
+
+    def setUp(self):
+        self.host = User.objects.create(username="host", email="host@example.com")
+        self.home = Building.objects.create(name="Home", area="courtyard")
+        self.away = Building.objects.create(name="Away", area="not_courtyard")
+        self.rooms_made = 0
+        self.original = self.make_room(self.home)
+        self.start = timezone.make_aware(datetime(3000, 1, 5, 12, 1))
+        self.end = timezone.make_aware(datetime(3000, 1, 8, 11, 59))
+        self.booking = CustomEvent.objects.create(calendar=self.original.calendar, event_type='occupancy', start=self.start, end=self.end,
+                                                  title="Booking", creator=self.host, guest_name="Guest", guest_type=CustomEvent.GuestType.STRANGER)
+
+    def make_room(self, building, free=False):
+        self.rooms_made += 1
+        section = Section.objects.create(name=f"Section {self.rooms_made}", building=building)
+        room = Room.objects.create(number=self.rooms_made, section=section, calendar=Calendar.objects.create(slug=f"reassign-{self.rooms_made}"))
+        CustomEvent.objects.filter(calendar=room.calendar).delete()
+        if free:
+            CustomEvent.objects.create(calendar=room.calendar, event_type='availability',
+                                       start=timezone.make_aware(datetime(3000, 1, 1, 12, 1)), end=timezone.make_aware(datetime(3000, 1, 20, 11, 59)))
+        return room
+
+    def stopgaps(self):
+        return CustomEvent.objects.filter(event_type='occupancy').exclude(id=self.booking.id)
+
+    def test_prefers_the_original_building(self):
+        self.make_room(self.away, free=True)
+        same_building = self.make_room(self.home, free=True)
+        self.make_room(self.home)
+
+        reassign_displaced_bookings(self.fragments(self.booking), self.original)
+
+        self.assertEqual([event.calendar_id for event in self.stopgaps()], [same_building.calendar_id])
+        # queued, not sent during the request
+        self.assertEqual(len(mail.outbox), 0)
+        send_outbox()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn("reassigned", mail.outbox[0].body)
+
+    def test_nothing_free(self):
+        self.make_room(self.away)
+
+        reassign_displaced_bookings(self.fragments(self.booking), self.original)
+
+        self.assertFalse(self.stopgaps().exists())
+        send_outbox()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn("could not be automatically assigned", mail.outbox[0].body)
+
+    def add_booking(self, start_day, end_day, name):
+        return CustomEvent.objects.create(calendar=self.original.calendar, event_type='occupancy',
+                                          start=timezone.make_aware(datetime(3000, 1, start_day, 12, 1)),
+                                          end=timezone.make_aware(datetime(3000, 1, end_day, 11, 59)),
+                                          title="Booking", creator=self.host, guest_name=name)
+
+    def fragments(self, *bookings):
+        return [displaced_fragment(booking, booking.start, booking.end, "Owner") for booking in bookings]
+
+    def test_overlapping_guests_get_different_rooms(self):
+        rooms = {self.make_room(self.home, free=True), self.make_room(self.away, free=True)}
+        other = self.add_booking(6, 9, "Other")
+
+        report = reassign_displaced_bookings(self.fragments(self.booking, other), self.original)
+
+        self.assertEqual(report['unassigned'], [])
+        self.assertEqual({entry['room'] for entry in report['reassigned']}, rooms)
+        # the nearer room goes to the earlier fragment
+        self.assertEqual(report['reassigned'][0]['event'], self.booking)
+        self.assertEqual(report['reassigned'][0]['room'].section.building, self.home)
+        self.assertEqual(self.stopgaps().exclude(id=other.id).count(), 2)
+        self.assertEqual(OutboxEmail.objects.count(), 2)
+
+    def test_one_room_goes_to_one_of_two_overlapping_guests(self):
+        free = self.make_room(self.home, free=True)
+        other = self.add_booking(6, 9, "Other")
+
+        report = reassign_displaced_bookings(self.fragments(self.booking, other), self.original)
+
+        self.assertEqual([entry['room'] for entry in report['reassigned']], [free])
+        self.assertEqual([entry['event'] for entry in report['unassigned']], [other])
+        # both changes go to the same host, as one digest
+        send_outbox()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn("reassigned", mail.outbox[0].body)
+        self.assertIn("could not be automatically assigned", mail.outbox[0].body)
+
+    def test_back_to_back_guests_can_share_a_room(self):
+        free = self.make_room(self.home, free=True)
+        later = self.add_booking(8, 10, "Later")
+
+        report = reassign_displaced_bookings(self.fragments(self.booking, later), self.original)
+
+        self.assertEqual([entry['room'] for entry in report['reassigned']], [free, free])
+
+    def test_fixed_query_count(self):
+        for _ in range(5):
+            self.make_room(self.home, free=True)
+        bookings = [self.add_booking(day, day + 2, f"Guest {day}") for day in range(1, 15, 2)]
+        original = Room.objects.select_related('section__building').get(id=self.original.id)
+
+        # the candidates for every fragment, in one query
+        with self.assertNumQueries(1):
+            plan = plan_reassignments(self.fragments(*bookings), original)
+        self.assertEqual(len(plan), len(bookings))
+
+    def test_delete_availability_reassigns_every_booking(self):
+        user = User.objects.create_superuser(username="admin", password="password")
+        self.client.force_login(user)
+        for _ in range(2):
+            self.make_room(self.away, free=True)
+        availability = CustomEvent.objects.create(calendar=self.original.calendar, event_type='availability',
+                                                  start=timezone.make_aware(datetime(3000, 1, 1, 12, 1)),
+                                                  end=timezone.make_aware(datetime(3000, 1, 20, 11, 59)))
+        self.add_booking(6, 9, "Other")
+
+        self.client.post(reverse('delete_availability_with_room_redirect', args=[self.original.id]),
+                         {'event_id': availability.id, 'start_date': '3000-01-01', 'end_date': '3000-01-20'})
+
+        self.assertFalse(CustomEvent.objects.filter(calendar=self.original.calendar).exists())
+        moved = CustomEvent.objects.filter(event_type='occupancy')
+        self.assertEqual(moved.count(), 2)
+        self.assertEqual(len({event.calendar_id for event in moved}), 2)
+
+
+# The nested loop version of process_occupancy_events, kept as the reference the sweep has to match
+def legacy_process_occupancy_events(availability_events, occupancy_events):
+    occupancy_events_processed = []
+    for avail_event in availability_events:
+        edge_date = avail_event.start
+        for occ_event in occupancy_events:
+            if occ_event.start >= avail_event.start and occ_event.end <= avail_event.end:
+                if occ_event.start > edge_date and edge_date.date() != occ_event.start.date():
+                    occupancy_events_processed.append({'start': edge_date, 'end': occ_event.start, 'type': 'Vacant'})
+                occupancy_events_processed.append({
+                    'event': occ_event, 'start': occ_event.start, 'end': occ_event.end,
+                    'type': 'Booked', 'title': occ_event.title, 'id': occ_event.id})
+                edge_date = occ_event.end
+        if edge_date < avail_event.end and edge_date.date() != avail_event.end.date():
+            occupancy_events_processed.append({'start': edge_date, 'end': avail_event.end, 'type': 'Vacant'})
+    return occupancy_events_processed
+
+
+class ProcessOccupancyEventsPropertyTest(SimpleTestCase):
+
+    RUNS = 500
+
+    # times the views actually use (11:59 / 12:01) plus a few odd ones so same-day edges come up
+    def random_moment(self, rng):
+        day = timezone.make_aware(datetime(3000, 1, 1)) + timedelta(days=rng.randint(0, 40))
+        return day + rng.choice([timedelta(hours=11, minutes=59), timedelta(hours=12, minutes=1), timedelta(hours=rng.randint(0, 23))])
+
+    def random_events(self, rng, count, prefix, first_id):
+        events = []
+        for i in range(count):
+            start = self.random_moment(rng)
+            end = start + timedelta(hours=rng.randint(0, 24 * 10))
+            events.append(SimpleNamespace(start=start, end=end, title=f"{prefix} {i}", id=first_id + i))
+        # the views always hand these over ordered by start
+        return sorted(events, key=lambda event: event.start)
+
+    def random_merged_availabilities(self, rng):
+        events = []
+        moment = self.random_moment(rng) - timedelta(days=20)
+        for i in range(rng.randint(0, 6)):
+            start = moment + timedelta(days=rng.randint(1, 5), hours=rng.randint(0, 23))
+            end = start + timedelta(days=rng.randint(0, 12), hours=rng.randint(0, 23))
+            events.append(SimpleNamespace(start=start, end=end, title=f"Availability {i}", id=1000 + i))
+            moment = end
+        return events
+
+    def test_matches_nested_loop_on_random_calendars(self):
+        for seed in range(self.RUNS):
+            rng = random.Random(seed)
+            if rng.random() < 0.5:
+                availability = self.random_merged_availabilities(rng)
+            else:
+                # overlapping availabilities "shouldn't exist" but the output still has to match
+                availability = self.random_events(rng, rng.randint(0, 6), "Availability", 1000)
+            occupancy = self.random_events(rng, rng.randint(0, 15), "Booking", 1)
+
+            with self.subTest(seed=seed):
+                expected = legacy_process_occupancy_events(availability, occupancy)
+                self.assertEqual(process_occupancy_events(availability, occupancy), expected)
+                self.assertEqual(process_occupancy_events(IntervalIndex(availability), IntervalIndex(occupancy)), expected)
+
+    def test_empty_and_missing_inputs(self):
+        self.assertEqual(process_occupancy_events([], []), [])
+        self.assertEqual(process_occupancy_events(None, None), [])
@@ -4,7 +4,7 @@ from django.urls import path
 
 from catalog.views.main_views import (
     available_rooms, all_guests, 
-    rooms_master, my_guests, my_room,
+    rooms_master, my_guests, my_room, guest_history,
     # buildings_offline_toggle,
     # toggle_offline_section,
     
@@ -18,6 +18,7 @@ from catalog.views.availability_views import (
 )
 from catalog.views.error_views import no_room, no_person
 from catalog.views.ownership_views import remove_owner, assign_owner
+from catalog.views.instrumentation_views import instrumentation_stats
 
 
 
@@ -43,6 +44,7 @@ urlpatterns = [
 
     path('all_guests/', all_guests, name='all_guests'),
     path('my_guests/', my_guests, name='my_guests'),
+    path('guest_history/', guest_history, name='guest_history'),
 
     path('delete_booking/<int:event_id>/', delete_booking, name='delete_booking'),
     path('delete_booking/<int:event_id>/<int:section_id>/', delete_booking, name='delete_booking_with_section'),
@@ -74,6 +76,8 @@ urlpatterns = [
 
     path('assign_owner/<int:room_id>/', assign_owner, name='assign_owner'),
     path('assign_owner/<int:room_id>/<int:section_id>/', assign_owner, name='assign_owner_with_section'),
+
+    path('instrumentation/', instrumentation_stats, name='instrumentation_stats'),
 ]
 
 if settings.DEBUG:
@@ -1,24 +1,41 @@
 
+import random
+from collections import defaultdict
 from datetime import datetime, time
 
 import pytz
 
-from django.core.mail import send_mail
+from django.db import connection, transaction
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django.shortcuts import render, get_object_or_404, redirect
 
-from catalog.models import CustomEvent, Room, Building
+from catalog.availability import reassignment_candidates
+from catalog.intervals import IntervalIndex
+from catalog.models import CustomEvent
+from catalog.outbox import queue_emails
+from catalog.room_days import rebuild_room_days
+from schedule.models import Event
 
 
 # Merge overlapping availability events on a single calendar
 # I guess this could have been part of Calendar model
 #  but that model is imported so I didn't want to mess with it
-def merge_overlapping_availabilities(calendar):
+# index is an optional prebuilt CalendarIndex (catalog/intervals.py), its availability events get merged in place
+#
+# The merge is worked out in memory, then written with one bulk_update and one delete in a transaction
+# Returns a summary: {'events': the merged events in start order, 'updated': ids extended, 'deleted': ids absorbed}
+# so callers can tell when nothing merged (both id lists empty)
+def merge_overlapping_availabilities(calendar, index=None):
     
     # get availability events from calendar ordered by start date
-    events = CustomEvent.objects.filter(calendar = calendar, event_type='availability').order_by('start')
+    if index is not None:
+        events = list(index.availability)
+    else:
+        events = list(CustomEvent.objects.filter(calendar = calendar, event_type='availability').order_by('start'))
     merged_events = []
+    changed_events = {}
+    absorbed_ids = []
     
     # go through them
     for event in events:
@@ -38,16 +55,75 @@ def merge_overlapping_availabilities(calendar):
             if normalized_current_start <= normalized_last_end:
                 if event.end > last_event.end:
                     last_event.end = event.end
-                last_event.save()
-                event.delete()
+                    changed_events[last_event.id] = last_event
+                absorbed_ids.append(event.id)
 
             else:
                 # there's no overlap so don't merge anything
                 merged_events.append(event)
 
-    # save your work
-    for event in merged_events:
-        event.save()
+    # save your work, all or nothing
+    if changed_events or absorbed_ids:
+        with transaction.atomic():
+            if changed_events:
+                now = timezone.now()
+                for event in changed_events.values():
+                    event.updated_on = now
+                CustomEvent.objects.bulk_update(changed_events.values(), ['end', 'updated_on'])
+            if absorbed_ids:
+                CustomEvent.objects.filter(id__in=absorbed_ids).delete()
+
+        # keep a passed in index in step with what's now in the database
+        if index is not None:
+            index.availability = IntervalIndex(merged_events)
+
+    return {
+        'events': merged_events,
+        'updated': list(changed_events),
+        'deleted': absorbed_ids,
+    }
+
+# bulk_create() refuses multi-table inherited models like CustomEvent,
+# so this does one bulk insert for the schedule Event rows and one for the catalog rows
+# no signals and no save(), so dates are made aware here the same way CustomEvent.save does it
+def bulk_create_custom_events(events, batch_size=500):
+    events = list(events)
+    local_fields = [field for field in CustomEvent._meta.local_concrete_fields if field.name != 'event_ptr']
+
+    with transaction.atomic():
+        parents = []
+        for event in events:
+            if timezone.is_naive(event.start):
+                event.start = timezone.make_aware(event.start, timezone.get_current_timezone())
+            if timezone.is_naive(event.end):
+                event.end = timezone.make_aware(event.end, timezone.get_current_timezone())
+            parents.append(Event(
+                start=event.start,
+                end=event.end,
+                title=event.title,
+                description=event.description,
+                creator_id=event.creator_id,
+                calendar_id=event.calendar_id,
+            ))
+        Event.objects.bulk_create(parents, batch_size=batch_size)
+
+        columns = ', '.join([CustomEvent._meta.pk.column] + [field.column for field in local_fields])
+        placeholders = ', '.join(['%s'] * (len(local_fields) + 1))
+        rows = []
+        for event, parent in zip(events, parents):
+            event.event_ptr_id = event.id = parent.pk
+            event.created_on = parent.created_on
+            event.updated_on = parent.updated_on
+            event._state.adding = False
+            rows.append([parent.pk] + [field.get_db_prep_save(getattr(event, field.attname), connection) for field in local_fields])
+
+        with connection.cursor() as cursor:
+            for i in range(0, len(rows), batch_size):
+                cursor.executemany(
+                    f"INSERT INTO {CustomEvent._meta.db_table} ({columns}) VALUES ({placeholders})",
+                    rows[i:i + batch_size],
+                )
+    return events
 
 # Set time of day equal for comparing days
 def normalize_time(datetime):
@@ -96,67 +172,90 @@ def ensure_timezone_aware(date, tz_name='America/New_York'):
     return converted_date
 
 
-# occupation events will sometimes be disrupted by the alteration of availabiliity events
-# this attempts to find another room that is available for the missing chunk of time
-# calls create_stopgap_booking if possible, sends emails regardless
-def handle_reassign(occ_event, start_date, end_date, owner, room):
-                  
-    guest_type = occ_event.guest_type
-    guest_name = occ_event.guest_name
-    host_email = occ_event.creator.email
-
-    original_room = room
-
-    # getting available rooms in order of assumed geographic preference
-    original_building = original_room.section.building
-    buildings_in_same_area = Building.objects.filter(area=original_building.area).exclude(id=original_building.id)
-    buildings_in_other_area = Building.objects.exclude(area = original_building.area)
-
-    # randomly order the rooms in each area
-    rooms_in_original_building = Room.objects.filter(section__building = original_building).order_by('?')
-    rooms_in_same_area = Room.objects.filter(section__building__in = buildings_in_same_area).order_by('?')
-    rooms_outside_original_area = Room.objects.filter(section__building__in = buildings_in_other_area).order_by('?')
-
-    # ooh boy now we've got a list
-    rooms = list(rooms_in_original_building) + list(rooms_in_same_area) + list(rooms_outside_original_area)
-
-    event_assigned = False
-
-    for room in rooms:
-        email_start_date = start_date.strftime('%Y-%m-%d')
-        email_end_date = end_date.strftime('%Y-%m-%d')
-
-        if room.is_available(start_date, end_date) and (
-          (room.owner and int(guest_type) >= int(room.owner.preference)) or not room.owner):
-
-                create_stopgap_booking(room, occ_event, start_date, end_date, occ_event.guest_type, occ_event.guest_name)
-                event_assigned = True
-
-                send_mail(
-                          "Your room booking has changed",
-                          f"{owner} has had an availability change. Your guest {guest_name} has been reassigned to a different room from {email_start_date} to {email_end_date}. Visit 'My Guests' in the room system to see the details. ",
-                          "autoRoomAss@email.com",
-                          [f"{host_email}"],
-                          fail_silently=False
-                          )
-
-                return
-                          
-                              
-    if not event_assigned:
-          #print('event not reassigned')
-          send_mail(
-                          "Your room booking has changed",
-                          f"{owner} has had an availability change. Your guest {guest_name} could not be automatically assigned to a different room. Contact the room assigner for help. ",
-                          "autoRoomAss@email.com",
-                          [f"{host_email}"],
-                          fail_silently=False
-                          )
-# for automatic reassign
-def create_stopgap_booking(room, event, start_date, end_date, guest_type, guest_name):
-                              
-  #book it
-    booking_event = CustomEvent(
+# A piece of a booking that lost the availability under it and needs another room
+# event is the booking it came from (it may since have been truncated or deleted, only its guest details are used)
+# owner is who to blame in the email
+def displaced_fragment(event, start_date, end_date, owner):
+    return {'event': event, 'start': start_date, 'end': end_date, 'owner': owner}
+
+
+# Occupation events will sometimes be disrupted by the alteration of availability events,
+# this finds rooms for every displaced fragment of an availability edit/delete at once
+# 1 query however many fragments, the rules live in availability.reassignment_candidates
+#
+# fragments are placed earliest first, each in the nearest candidate room (same building, same area, anywhere,
+# shuffled within each) that this plan hasn't already put someone in for those dates
+# returns the fragments as a list with 'room' added (None when nothing fits)
+def plan_reassignments(fragments, original_room, rng=random):
+    fragments = sorted(fragments, key=lambda fragment: fragment['start'])
+    windows = [(fragment['start'], fragment['end'], fragment['event'].guest_type) for fragment in fragments]
+    candidates = reassignment_candidates(original_room, windows, rng)
+
+    planned = defaultdict(list)  # room id -> [(start, end)] this plan has booked
+    plan = []
+    for fragment, ranked in zip(fragments, candidates):
+        start_date, end_date = fragment['start'], fragment['end']
+        room = next((
+            room for room in ranked
+            if not any(start < end_date and end > start_date for start, end in planned[room.id])
+        ), None)
+        if room:
+            planned[room.id].append((start_date, end_date))
+        plan.append(dict(fragment, room=room))
+    return plan
+
+
+# Books every placed fragment in one transaction (two inserts), then brings the rooms' RoomDayStatus rows up to date
+# since the bulk insert skips the save signals
+def apply_reassignments(plan):
+    placed = [entry for entry in plan if entry['room']]
+    if not placed:
+        return
+
+    bookings = [
+        stopgap_booking(entry['room'], entry['event'], entry['start'], entry['end'], entry['event'].guest_type, entry['event'].guest_name)
+        for entry in placed
+    ]
+    with transaction.atomic():
+        bulk_create_custom_events(bookings)
+        rebuild_room_days({entry['room'] for entry in placed})
+
+
+# One email per fragment to the guest's host, reassigned or not
+# queued in the outbox (catalog/outbox.py) so a slow or broken SMTP server can't hold up the edit
+def notify_reassignments(plan):
+    emails = []
+    for entry in plan:
+        event = entry['event']
+        if not event.creator or not event.creator.email:
+            continue
+
+        if entry['room']:
+            email_start_date = entry['start'].strftime('%Y-%m-%d')
+            email_end_date = entry['end'].strftime('%Y-%m-%d')
+            message = f"{entry['owner']} has had an availability change. Your guest {event.guest_name} has been reassigned to a different room from {email_start_date} to {email_end_date}. Visit 'My Guests' in the room system to see the details. "
+        else:
+            message = f"{entry['owner']} has had an availability change. Your guest {event.guest_name} could not be automatically assigned to a different room. Contact the room assigner for help. "
+
+        emails.append((event.creator.email, "Your room booking has changed", message))
+    queue_emails(emails)
+
+
+# Plan, book and email for a batch of displaced fragments from original_room
+# returns a report: {'reassigned': [plan entries with a room], 'unassigned': [plan entries without]}
+def reassign_displaced_bookings(fragments, original_room):
+    plan = plan_reassignments(fragments, original_room)
+    apply_reassignments(plan)
+    notify_reassignments(plan)
+    return {
+        'reassigned': [entry for entry in plan if entry['room']],
+        'unassigned': [entry for entry in plan if not entry['room']],
+    }
+
+
+# the unsaved booking, so batches can bulk insert them
+def stopgap_booking(room, event, start_date, end_date, guest_type, guest_name):
+    return CustomEvent(
     calendar=room.calendar,
     event_type='occupancy',
     start=start_date,
@@ -167,43 +266,62 @@ def create_stopgap_booking(room, event, start_date, end_date, guest_type, guest_
     guest_type = guest_type,
     guest_name = guest_name
     )
-    booking_event.save()
 
-# i think this is assessing events on a room's calender in order to create a sensible display
-# but it's been while since I've looked at it
+# Builds the Booked/Vacant timeline a room page shows inside each availability:
+# every booking that sits inside an availability, with Vacant blocks for the gaps
+# (gaps that start and end on the same day aren't worth showing)
+#
+# both arguments can be querysets, lists or IntervalIndex objects (catalog/intervals.py)
+# each is read from the database once, sorted by start, then walked with two pointers:
+# the occupancy pointer only moves forward as availabilities move forward,
+# so merged (non overlapping) availabilities cost O(A + O) instead of O(A * O)
 def process_occupancy_events(availability_events, occupancy_events):
-    
+
+    by_start = lambda event: event.start
+    availability_events = sorted(availability_events or [], key=by_start)
+    occupancy_events = sorted(occupancy_events or [], key=by_start)
+
     occupancy_events_processed = []
+    first_candidate = 0
 
     for avail_event in availability_events:
-            
 
-              edge_date = avail_event.start
-              for occ_event in occupancy_events:
-                  if occ_event.start >= avail_event.start and occ_event.end <= avail_event.end:
-
-                    if occ_event.start > edge_date and edge_date.date() != occ_event.start.date():
-                          occupancy_events_processed.append({
-                              'start': edge_date,
-                              'end': occ_event.start,
-                              'type': 'Vacant'
-                          })
-                    
-                    occupancy_events_processed.append({
-                        'event': occ_event,
-                        'start': occ_event.start,
-                        'end': occ_event.end,
-                        'type': 'Booked',
-                        'title': occ_event.title,
-                        'id':occ_event.id
-                        })
-                    
-                    edge_date = occ_event.end
-
-              if edge_date < avail_event.end and edge_date.date() != avail_event.end.date():
+        # skip bookings that start before this availability, later availabilities start later still
+        while first_candidate < len(occupancy_events) and occupancy_events[first_candidate].start < avail_event.start:
+            first_candidate += 1
+
+        edge_date = avail_event.start
+        i = first_candidate
+        # anything starting after the availability ends can't be inside it
+        while i < len(occupancy_events) and occupancy_events[i].start <= avail_event.end:
+            occ_event = occupancy_events[i]
+            i += 1
+            if occ_event.end > avail_event.end:
+                continue
+
+            if occ_event.start > edge_date and edge_date.date() != occ_event.start.date():
                 occupancy_events_processed.append({
+                    'start': edge_date,
+                    'end': occ_event.start,
+                    'type': 'Vacant'
+                })
+
+            occupancy_events_processed.append({
+                'event': occ_event,
+                'start': occ_event.start,
+                'end': occ_event.end,
+                'type': 'Booked',
+                'title': occ_event.title,
+                'id': occ_event.id
+            })
+
+            edge_date = occ_event.end
+
+        if edge_date < avail_event.end and edge_date.date() != avail_event.end.date():
+            occupancy_events_processed.append({
                 'start': edge_date,
                 'end': avail_event.end,
                 'type': 'Vacant'
-              })
-    return occupancy_events_processed
\ No newline at end of file
+            })
+
+    return occupancy_events_processed
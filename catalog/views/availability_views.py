@@ -8,7 +8,7 @@ from django.shortcuts import get_object_or_404, redirect, render
 
 from catalog.models import Room, CustomEvent, Person
 from catalog.forms import CreateAvailabilityForm, EditAvailabilityForm, DeleteAvailabilityForm, GuestPreferencesForm
-from catalog.utils import date_to_aware_datetime, merge_overlapping_availabilities, handle_reassign
+from catalog.utils import date_to_aware_datetime, displaced_fragment, merge_overlapping_availabilities, reassign_displaced_bookings
 
 ###################################################################################################################################
 @login_required
@@ -111,6 +111,9 @@ def edit_availability(request, room_id = None, section_id = None):
                 end__lte=orig_avail_end_date
             ).order_by('start')
 
+            # displaced pieces of bookings, reassigned together once everything is trimmed
+            displaced = []
+
             for occ_event in occupancy_events:
               start_date= occ_event.start
               end_date = occ_event.end
@@ -130,10 +133,10 @@ def edit_availability(request, room_id = None, section_id = None):
               
                   # Attempt to reassign the tail end of the occupancy
                   if new_avail_end_date > occ_event.start:
-                    handle_reassign(occ_event, new_avail_end_date, end_date,owner_name,room )
+                    displaced.append(displaced_fragment(occ_event, new_avail_end_date, end_date, owner_name))
                   # Attempt to reassign the whole occupancy because new window's end date is before occupation start
                   else:
-                    handle_reassign(occ_event, start_date,end_date,owner_name,room)
+                    displaced.append(displaced_fragment(occ_event, start_date, end_date, owner_name))
                     full_reassign = True
 
               # If we're not done, handle the front end as we did for the tail end above
@@ -143,15 +146,19 @@ def edit_availability(request, room_id = None, section_id = None):
 
                   # Partial reassign attempt
                   if new_avail_start_date < occ_event.end:
-                      handle_reassign(occ_event, start_date, new_avail_start_date, owner_name,room)
+                      displaced.append(displaced_fragment(occ_event, start_date, new_avail_start_date, owner_name))
                   # Full reassign attempt
                   else:
-                      handle_reassign(occ_event, start_date, end_date,owner_name,room)
+                      displaced.append(displaced_fragment(occ_event, start_date, end_date, owner_name))
 
               # Delete old occupancy if now completely outside of new availability window
               if occ_event.start >= occ_event.end: # happens via logic above in the 'else' branches
                   occ_event.delete()
 
+            # One planning pass for all of them, so two guests can't be put in the same room (utils.py)
+            if displaced:
+                reassign_displaced_bookings(displaced, calendar.room)
+
             # Rooms master redirects
             if source_page == 'rooms_master' and section_id:
               return redirect('rooms_master_with_section', section_id = section_id)
@@ -199,20 +206,22 @@ def delete_availability(request, room_id = None, section_id = None):
                 end__lte=avail_end_date
             ).order_by('start')
 
+            room = calendar.room
+            owner = 'Twin Oaks'
+            if room.owner:
+              owner = room.owner
+
+            displaced = []
             for event in occupancy_events:
-                start_date = event.start
-                end_date = event.end
-                room = event.calendar.room
-                owner = 'Twin Oaks'
-                if room.owner:
-                  owner = room.owner
-
-                # Attempt to reassign the events
-                handle_reassign(event, start_date, end_date, owner, room) # Function in utils.py
+                displaced.append(displaced_fragment(event, event.start, event.end, owner))
                 event.delete()
 
             avail_event.delete()
 
+            # Attempt to reassign the events, all in one go (utils.py)
+            if displaced:
+                reassign_displaced_bookings(displaced, room)
+
             if source_page == 'rooms_master' and section_id:
               return redirect('rooms_master_with_section', section_id = section_id)
             elif source_page == 'rooms_master' and room_id:
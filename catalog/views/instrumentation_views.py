@@ -0,0 +1,20 @@
+#
+# Views for the per view timings collected by catalog.instrumentation
+#
+
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
+from django.views.decorators.http import require_http_methods
+
+from catalog import caching, instrumentation
+
+
+# GET for the numbers since startup (or the last reset), POST to reset them
+# totals are per server process, the cache hit / miss counts (caching.py) come along too
+@staff_member_required
+@require_http_methods(['GET', 'POST'])
+def instrumentation_stats(request):
+    if request.method == 'POST':
+        instrumentation.reset()
+        caching.counters.clear()
+    return JsonResponse({'views': instrumentation.snapshot(), 'caches': dict(caching.counters)})
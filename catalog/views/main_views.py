@@ -3,21 +3,30 @@
 #
 
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.http import HttpResponseRedirect
+from django.core.paginator import Paginator
+from django.http import Http404, HttpResponseRedirect
 from django.shortcuts import render, get_object_or_404, redirect
 from django.utils import timezone
 
+from catalog.availability import find_available_rooms
+from catalog.caching import cached_available_rooms
+from catalog.choices import roomless_members
+from catalog.loaders import last_available_dates, load_household, load_section_rooms, occupancy_events_for_display
 from catalog.forms import DateRangeForm, PersonSelectForm, RoomSelectForm, SectionSelectForm
-from catalog.models import CustomEvent, Room, Person, Section
-from catalog.utils import date_to_aware_datetime, process_occupancy_events
+from catalog.models import ArchivedBooking, Room, Section
+from catalog.room_days import find_available_rooms_by_day
+from catalog.utils import date_to_aware_datetime
 
 from datetime import datetime, timedelta
 
+# Bookings per page on the all guests list
+GUESTS_PER_PAGE = 50
+
 ###################################################################################################################################
 def available_rooms(request):
 
     # Get and order rooms for sensible display later
-    rooms = Room.objects.select_related('section__building').order_by('section__building__name', 'section__name', 'number')
+    rooms = Room.objects.select_related('section__building', 'owner').order_by('section__building__name', 'section__name', 'number')
 
     # Handle form submission
     if request.method == 'POST':
@@ -66,17 +75,25 @@ def available_rooms(request):
     end_date = date_to_aware_datetime(end_date, 11, 59)
 
     # Collect available rooms
+    # (room has no owner OR guest fits within owner's preferences) AND dates are good, all rooms at once
+    # the per night table answers in one query (room_days.py), the event based search covers whatever it can't
+    def search():
+        available = find_available_rooms_by_day(rooms, start_date.date(), end_date.date(), guest_type)
+        if available is None:
+            available = find_available_rooms(rooms, start_date, end_date, guest_type) # This function is in availability.py
+        return available
+
+    # the same few date ranges get asked for all day, so the answer is cached until a room changes (caching.py)
+    available = cached_available_rooms(rooms, start_date, end_date, guest_type, search)
+
     available_rooms_info = []
-    for room in rooms:
-        # Check if dates are good AND (room has no owner OR guest fits within owner's preferences)
-        if room.is_available(start_date, end_date) and (not room.owner or int(guest_type) >= int(room.owner.preference)):
-          potential_end_date = room.get_last_available_date(start_date)
-          if room.image:
-            room_image_url = room.image.url
-          else:
-            room_image_url = "" 
-          room_name = str(room)
-          available_rooms_info.append((room, potential_end_date, room_image_url, room_name))
+    for room, potential_end_date in available:
+        if room.image:
+          room_image_url = room.image.url
+        else:
+          room_image_url = "" 
+        room_name = str(room)
+        available_rooms_info.append((room, potential_end_date, room_image_url, room_name))
 
     context = {
         'available_rooms_info': available_rooms_info,
@@ -93,15 +110,16 @@ def all_guests(request):
 
     processed_events = []
 
-    # Gather the bookings
-    occupancy_events = CustomEvent.objects.filter(event_type='occupancy')
+    # Gather the bookings, a page at a time, with rooms/owners/hosts joined in (loaders.py)
+    paginator = Paginator(occupancy_events_for_display(), GUESTS_PER_PAGE)
+    page_obj = paginator.get_page(request.GET.get('page'))
 
-    for event in occupancy_events:
+    for event in page_obj:
 
         # Determine what to display for room owner
         room_owner = "Unassigned"
-        room = getattr(event.calendar, 'room', None)  # Safely get the room attribute
-        if room and room.owner:
+        room = event.calendar.room
+        if room.owner:
             room_owner = room.owner
 
         event_info = {
@@ -109,14 +127,15 @@ def all_guests(request):
             'creator': event.creator,
             'start_date': event.start,
             'end_date': event.end,
-            'room_name': str(event.calendar.room),
-            'room_id': event.calendar.room.id,
+            'room_name': str(room),
+            'room_id': room.id,
             'room_owner': room_owner
             }
         processed_events.append(event_info)
 
     context = {
         'occupancy_events': processed_events,
+        'page_obj': page_obj,
     }
     return render(request, 'catalog/all_guests.html', context)
 
@@ -136,39 +155,13 @@ def my_room(request):
     return redirect('no_room')
 
   # Person exists for User, check for room
-  if hasattr(person, 'room'):
-    room = person.room
-    calendar = room.calendar
-    
-    # Events for room owner
-    events_exist = CustomEvent.objects.filter(calendar=calendar, event_type='availability').exists()
-    availability_events = CustomEvent.objects.filter(calendar=calendar, event_type='availability').order_by('start')
-    occupancy_events = CustomEvent.objects.filter(calendar = calendar, event_type = 'occupancy').order_by('start')
-    # Processing so we can display booked AND vacant timeblocks within an availability
-    occupancy_events_processed = process_occupancy_events(availability_events,occupancy_events) # This function is in utils.py
-
-    # Get events for any children
-    children = person.children.all()
-
-    children_info = {}
-    for child in children:
-                  child_room = Room.objects.get(owner=child)
-                  if child_room and child_room.calendar:
-                      child_calendar = child_room.calendar
-                      child_events_exist = CustomEvent.objects.filter(calendar=child_calendar, event_type='availability').exists()
-                      child_availability_events = CustomEvent.objects.filter(calendar=child_calendar, event_type='availability').order_by('start')
-                      child_occupancy_events = CustomEvent.objects.filter(calendar=child_calendar, event_type='occupancy').order_by('start')
-                      # Processing so we can display booked AND vacant timeblocks within an availability
-                      child_occupancy_events_processed = process_occupancy_events(child_availability_events,child_occupancy_events) # This function is in utils.py
-
-                      children_info[child] = {
-                          'availability_events': child_availability_events,
-                          'occupancy_events_and_vacancies': child_occupancy_events_processed,
-                          'room_image_url': child_room.image.url if child_room.image else '',
-                          'room_name': str(child.room),
-                          'events_exist':child_events_exist,
-                      }
-
+  # their room and their children's rooms come with events in one go (loaders.py)
+  household = load_household(person=person)
+  if household:
+    room = household['room']
+    room_info = household['room_info']
+    children = household['children']
+    children_info = household['children_info']
 
     # Get the current local date and the next day's date
     local_now = timezone.localtime(timezone.now())
@@ -178,16 +171,16 @@ def my_room(request):
     context = {
         'room': room,
         'room_id':room.id,
-        'availability_events': availability_events,
-        'occupancy_events_and_vacancies': occupancy_events_processed,
+        'availability_events': room_info['availability_events'],
+        'occupancy_events_and_vacancies': room_info['occupancy_events_and_vacancies'],
         'children_info': children_info,
         'children': children,
         'start_date': tomorrow.strftime('%Y-%m-%d'),
         'end_date': dayafter.strftime('%Y-%m-%d'),
         'source_page': 'my_room',
-        'room_image_url': room.image.url if room.image else '',
+        'room_image_url': room_info['room_image_url'],
         'room_name': room,
-        'events_exist': events_exist,
+        'events_exist': room_info['events_exist'],
     }
     return render(request, 'catalog/my_room.html', context)
       
@@ -204,13 +197,16 @@ def my_guests(request):
     request.session['source_page'] = 'my_guests'
 
     processed_events = []
-    occupancy_events = CustomEvent.objects.filter(event_type='occupancy', creator=request.user)
+    occupancy_events = list(occupancy_events_for_display().filter(creator=request.user))
+    # One query for every booking's last available date (loaders.py)
+    last_available = last_available_dates(occupancy_events)
 
     for event in occupancy_events:
+        room = event.calendar.room
         # Decide how to display room owners
         room_owner = "Unassigned"
-        if event.calendar.room.owner:
-            room_owner = event.calendar.room.owner
+        if room.owner:
+            room_owner = room.owner
 
         event_info = {
             'id': event.id,
@@ -218,9 +214,9 @@ def my_guests(request):
             'creator': event.creator,
             'start_date': event.start,
             'end_date': event.end,
-            'last_available': event.calendar.room.get_last_available_date(event.end),
-            'room_name': str(event.calendar.room),
-            'image_url': event.calendar.room.image.url if event.calendar.room.image else '',  # Store the image URL for each event
+            'last_available': last_available[event.id],
+            'room_name': str(room),
+            'image_url': room.image.url if room.image else '',  # Store the image URL for each event
             'room_owner': room_owner
         }
     
@@ -233,6 +229,22 @@ def my_guests(request):
     }
     return render(request, 'catalog/my_guests.html', context)
 
+###################################################################################################################################
+# Past bookings, read only. The expiry sweep moves finished bookings into ArchivedBooking (expiry.py)
+# everything needed is stored on the archive row, so this is one query per page
+@login_required
+@user_passes_test(lambda u: u.is_superuser)
+def guest_history(request):
+
+    paginator = Paginator(ArchivedBooking.objects.order_by('-start', '-id'), GUESTS_PER_PAGE)
+    page_obj = paginator.get_page(request.GET.get('page'))
+
+    context = {
+        'archived_bookings': page_obj,
+        'page_obj': page_obj,
+    }
+    return render(request, 'catalog/guest_history.html', context)
+
 ###################################################################################################################################
 @login_required
 @user_passes_test(lambda u: u.is_superuser or u.has_perm('app.view_all_rooms'))
@@ -241,7 +253,6 @@ def rooms_master(request, room_id=None, section_id=None):
     # For returning to correct page
     request.session['source_page'] = 'rooms_master'
 
-    roomless_members = Person.objects.filter(room__isnull=True)
     person_form = PersonSelectForm()
     room_form = RoomSelectForm()
     section_form = SectionSelectForm()
@@ -290,7 +301,8 @@ def rooms_master(request, room_id=None, section_id=None):
       room_name = None
       context = {
           'source_page': 'rooms_master',
-          'roomless_members':roomless_members
+          # rendered once per page, every unowned room's dropdown shares it
+          'roomless_members': roomless_members()
       }
 
       local_now = timezone.localtime(timezone.now())
@@ -308,7 +320,12 @@ def rooms_master(request, room_id=None, section_id=None):
 
       # if a single room is selected
       if room_id:
-        selected_room = get_object_or_404(Room, id=room_id)
+        # The room and any rooms belonging to its owner's children, events included (loaders.py)
+        household = load_household(room_id=room_id)
+        if household is None:
+          raise Http404("No Room matches the given query.")
+        selected_room = household['room']
+        room_info = household['room_info']
         room_name = str(selected_room)
         if selected_room.owner:
               selected_person = selected_room.owner
@@ -329,92 +346,37 @@ def rooms_master(request, room_id=None, section_id=None):
     
         # This will display info for ownerless rooms
         if selected_room:
-          calendar = selected_room.calendar
-
-          events_exist = CustomEvent.objects.filter(calendar=calendar, event_type='availability').exists()
-          availability_events = CustomEvent.objects.filter(calendar=calendar, event_type='availability').order_by('start') if calendar else None
-          occupancy_events = CustomEvent.objects.filter(calendar=calendar, event_type='occupancy').order_by('start') if calendar else None
-        
-          # Processing so we can display booked AND vacant timeblocks within an availability
-          occupancy_events_processed = process_occupancy_events(availability_events,occupancy_events)
-  
           context.update({
               'room': selected_room,
               'room_id': selected_room.id,
-              'room_image_url': selected_room.image.url if selected_room.image else '',
-              'availability_events': availability_events,
-              'occupancy_events_and_vacancies': occupancy_events_processed,
-              'events_exist': events_exist
+              'room_image_url': room_info['room_image_url'],
+              'availability_events': room_info['availability_events'],
+              'occupancy_events_and_vacancies': room_info['occupancy_events_and_vacancies'],
+              'events_exist': room_info['events_exist']
                     
           })
   
           # This is for rooms with owners, displaying mostly as owners would see it
           if selected_person:
-              children = selected_person.children.all()
-              children_info = {}
-  
-              for child in children:
-                  child_room = Room.objects.get(owner=child)
-                  if child_room and child_room.calendar:
-                      child_calendar = child_room.calendar
-                      child_availability_events = CustomEvent.objects.filter(calendar=child_calendar, event_type='availability').order_by('start')
-                      child_occupancy_events = CustomEvent.objects.filter(calendar=child_calendar, event_type='occupancy').order_by('start')
-                      events_exist = CustomEvent.objects.filter(calendar=child_calendar, event_type='availability').exists()
-                      child_occupancy_events_processed= process_occupancy_events(child_availability_events, child_occupancy_events)
-                      children_info[child] = {
-                          'availability_events': child_availability_events,
-                          'occupancy_events_and_vacancies': child_occupancy_events_processed,
-                          'room_image_url': child_room.image.url if child_room.image else '',
-                          'room_name': str(child_room),
-                          'events_exist':events_exist
-                      }
-  
               context.update({
-                  'children_info': children_info,
-                  'children': children,
+                  'children_info': household['children_info'],
+                  'children': household['children'],
 
               })
       
       # If an entire section of a building is selected
       elif section_id:
 
-        selected_section = get_object_or_404(Section, id=section_id)
-        rooms_in_section = Room.objects.filter(section=selected_section)
+        selected_section = get_object_or_404(Section.objects.select_related('building'), id=section_id)
 
-        section_events = {}
-  
-        for room in rooms_in_section:
-          
-            if room and room.calendar:
-              
-                calendar = room.calendar
-                room_title = str(room)
-                if room.owner:
-                    room_title = str(room.owner) + "'s Room"
-
-                events_exist = CustomEvent.objects.filter(calendar=calendar, event_type='availability').exists()
-                availability_events = CustomEvent.objects.filter(calendar=calendar, event_type='availability').order_by('start')
-                occupancy_events = CustomEvent.objects.filter(calendar=calendar, event_type='occupancy').order_by('start')
-              
-                # Processing so we can display booked AND vacant timeblocks within an availability
-                occupancy_events_processed = process_occupancy_events(availability_events,occupancy_events)
-
-                section_events[room] = {
-                    'availability_events': availability_events,
-                    'occupancy_events_and_vacancies': occupancy_events_processed,
-                    'room_image_url': room.image.url if room.image else '',
-                    'room_name': str(room),
-                    'events_exist':events_exist,
-                    'room_id':room.id,
-                    'owner_id':room.owner.id if room.owner else None,
-                    'room_title' : room_title,
-                }
+        # Every room in the section with owner, calendar and processed events, in a fixed number of queries
+        section_events = load_section_rooms(selected_section) # This function is in loaders.py
 
         context.update({
             'selected_section': selected_section,
             'section_title': str(selected_section) + " Section",
             'section_id':section_id,
-            'rooms_in_section': rooms_in_section,
+            'rooms_in_section': list(section_events),
         })
         context.update({
                   'section_events': section_events,
@@ -0,0 +1,122 @@
+import os
+import sys
+import random
+import time
+import django
+
+# Add the project root to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Set the Django settings module
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'RoomAss.settings')
+
+# Initialize Django
+django.setup()
+
+from datetime import datetime, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.utils import timezone
+
+from catalog.models import Building, Section, Room, CustomEvent
+from catalog.utils import bulk_create_custom_events
+from schedule.models import Calendar
+
+
+# Query plans and timings for the hot CustomEvent filters, before and after migration 0029
+#
+# Runs against a throwaway test database, never the real one:
+#   python scripts/benchmark_event_indexes.py [rooms] [events per room]
+# defaults are 500 rooms x 60 events = 30,000 events
+
+REPEATS = 20
+# members who make the bookings, so my_guests has something to find
+HOSTS = 50
+
+
+def seed(room_count, events_per_room):
+    building = Building.objects.create(name="Bench", area="not_courtyard")
+    section = Section.objects.create(name="Bench", building=building)
+
+    calendars = Calendar.objects.bulk_create(
+        [Calendar(name=f"Bench {i}", slug=f"bench-{i}") for i in range(room_count)]
+    )
+    Room.objects.bulk_create(
+        [Room(section=section, number=i, calendar=calendar) for i, calendar in enumerate(calendars)]
+    )
+    hosts = User.objects.bulk_create([User(username=f"bench-host-{i}") for i in range(HOSTS)])
+
+    # each calendar gets alternating stretches of availability with a booking or two inside
+    first_day = timezone.make_aware(datetime(2024, 1, 1, 12, 0))
+    events = []
+    for calendar in calendars:
+        day = first_day
+        for _ in range(events_per_room // 2):
+            length = random.randint(5, 20)
+            events.append(CustomEvent(calendar=calendar, event_type='availability', start=day, end=day + timedelta(days=length), title="Availability"))
+            booking_start = day + timedelta(days=random.randint(0, length - 2))
+            events.append(CustomEvent(calendar=calendar, event_type='occupancy', start=booking_start, end=booking_start + timedelta(days=2), title="Booking", guest_name="Bench", creator=random.choice(hosts)))
+            day += timedelta(days=length + random.randint(1, 10))
+    bulk_create_custom_events(events)
+    return calendars, hosts
+
+
+def hot_queries(calendar, host, now):
+    return {
+        'is_available (occupancy overlap)': CustomEvent.objects.filter(
+            calendar=calendar, event_type='occupancy', start__lt=now + timedelta(days=3), end__gt=now),
+        'is_available (covering availability)': CustomEvent.objects.filter(
+            calendar=calendar, event_type='availability', start__lte=now, end__gte=now + timedelta(days=3)),
+        'get_last_available_date (next occupancy)': CustomEvent.objects.filter(
+            calendar=calendar, event_type='occupancy', start__gte=now, start__lt=now + timedelta(days=30)).order_by('start'),
+        'my_room / rooms_master (availability list)': CustomEvent.objects.filter(
+            calendar=calendar, event_type='availability').order_by('start'),
+        'my_guests (occupancy by creator)': CustomEvent.objects.filter(
+            event_type='occupancy', creator=host),
+        'expiry sweep (ended events)': CustomEvent.objects.filter(
+            end__lt=now),
+    }
+
+
+# refresh planner statistics so the plans reflect the seeded data
+def analyze():
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def measure(label, calendars, hosts, now):
+    print(f"\n===== {label} =====")
+    for name, queryset in hot_queries(random.choice(calendars), random.choice(hosts), now).items():
+        sample = random.sample(calendars, min(REPEATS, len(calendars)))
+        started = time.perf_counter()
+        for calendar in sample:
+            # pks only, so the timing is the database and not model instantiation
+            list(hot_queries(calendar, random.choice(hosts), now)[name].values_list('pk', flat=True))
+        elapsed = (time.perf_counter() - started) / len(sample) * 1000
+        print(f"\n-- {name}: {elapsed:.2f} ms/query")
+        print(queryset.explain())
+
+
+if __name__ == "__main__":
+    room_count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    events_per_room = int(sys.argv[2]) if len(sys.argv) > 2 else 60
+
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        random.seed(0)
+        calendars, hosts = seed(room_count, events_per_room)
+        print(f"Seeded {CustomEvent.objects.count()} events across {len(calendars)} rooms")
+        now = timezone.make_aware(datetime(2025, 6, 1, 12, 0))
+
+        call_command('migrate', 'catalog', '0028', verbosity=0)
+        analyze()
+        measure("Before (0028, no composite indexes)", calendars, hosts, now)
+
+        call_command('migrate', 'catalog', '0029', verbosity=0)
+        analyze()
+        measure("After (0029)", calendars, hosts, now)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
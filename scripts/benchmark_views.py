@@ -0,0 +1,202 @@
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import django
+
+# Add the project root to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Set the Django settings module
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'RoomAss.settings')
+
+# Initialize Django
+django.setup()
+
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment
+from django.urls import reverse
+from django.utils import timezone
+
+from catalog.models import CustomEvent, Person, Room
+from loadtest_data import generate
+
+
+# Wall time and query counts for the main pages and the booking / availability writes
+#
+# Seeds a throwaway test database with loadtest_data.generate(), never touches the real one:
+#   python scripts/benchmark_views.py [--rooms 200 --events 6000 ...] [--save results.json] [--compare old.json]
+# save a run per release and --compare against it to see what got slower or chattier
+#
+# Writes run inside a transaction that's rolled back, so every repeat sees the same data
+
+
+class Scenario:
+
+    def __init__(self, name, user, request, writes=False):
+        self.name = name
+        self.user = user
+        self.request = request
+        self.writes = writes
+
+
+def scenarios(data, rng):
+    superuser = data['superuser']
+    rooms = data['rooms']
+    owned = [room for room in rooms if room.owner_id]
+    today = timezone.localdate()
+
+    # a member with children, so my_room loads a whole household
+    owners = Person.objects.filter(user__isnull=False, room__isnull=False)
+    parent = owners.filter(children__isnull=False).first() or owners.first()
+    # whoever has hosted the most
+    host_id = CustomEvent.objects.filter(event_type='occupancy').values('creator').annotate(
+        n=Count('pk')).order_by('-n').values_list('creator', flat=True).first()
+    host = next(user for user in data['users'] if user.id == host_id)
+
+    # availability with bookings inside, the expensive kind to edit or delete
+    busy = list(CustomEvent.objects.filter(
+        event_type='availability', calendar__room__in=owned, end__gte=timezone.now() + timedelta(days=5),
+    ).order_by('pk')[:200])
+
+    def available_rooms(client):
+        return client.get(reverse('available_rooms'))
+
+    def rooms_master_section(client):
+        return client.get(reverse('rooms_master_with_section', args=[rng.choice(data['sections']).id]))
+
+    def rooms_master_room(client):
+        return client.get(reverse('rooms_master_with_room', args=[rng.choice(rooms).id]))
+
+    def my_room(client):
+        return client.get(reverse('my_room'))
+
+    def my_guests(client):
+        return client.get(reverse('my_guests'))
+
+    def all_guests(client):
+        return client.get(reverse('all_guests'))
+
+    def create_booking(client):
+        start = today + timedelta(days=rng.randint(1, 80))
+        return client.post(reverse('create_booking'), {
+            'room_id': rng.choice(rooms).id,
+            'start_date': start, 'end_date': start + timedelta(days=rng.randint(1, 4)),
+            'guest_name': "Bench Guest", 'host_name': "Bench Host", 'guest_type': 2,
+        })
+
+    # trims a few days off both ends, displacing whatever was booked there
+    def edit_availability(client):
+        event = rng.choice(busy)
+        start = timezone.localtime(event.start).date() + timedelta(days=2)
+        end = max(start + timedelta(days=1), timezone.localtime(event.end).date() - timedelta(days=2))
+        return client.post(reverse('edit_availability_with_room_redirect', args=[event.calendar.room.id]), {
+            'event_id': event.id, 'start_date': start, 'end_date': end,
+        })
+
+    def delete_availability(client):
+        event = rng.choice(busy)
+        return client.post(reverse('delete_availability_with_room_redirect', args=[event.calendar.room.id]), {
+            'event_id': event.id, 'start_date': timezone.localtime(event.start).date(), 'end_date': timezone.localtime(event.end).date(),
+        })
+
+    return [
+        Scenario('available_rooms', host, available_rooms),
+        Scenario('rooms_master by section', superuser, rooms_master_section),
+        Scenario('rooms_master by room', superuser, rooms_master_room),
+        Scenario('my_room', parent.user, my_room),
+        Scenario('my_guests', host, my_guests),
+        Scenario('all_guests', superuser, all_guests),
+        Scenario('create_booking', host, create_booking, writes=True),
+        Scenario('edit_availability', superuser, edit_availability, writes=True),
+        Scenario('delete_availability', superuser, delete_availability, writes=True),
+    ]
+
+
+def run(scenario, repeats):
+    client = Client()
+    client.force_login(scenario.user)
+    # available_rooms reads its dates from the session, ask for a week a little way out
+    start = timezone.localdate() + timedelta(days=7)
+    client.post(reverse('available_rooms'), {'start_date': start, 'end_date': start + timedelta(days=7), 'guest_type': 2})
+
+    times, queries = [], []
+    for _ in range(repeats):
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = scenario.request(client)
+                elapsed = time.perf_counter() - started
+            if scenario.writes:
+                transaction.set_rollback(True)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{scenario.name} returned {response.status_code}")
+        times.append(elapsed * 1000)
+        queries.append(len(captured))
+
+    return {
+        'median_ms': statistics.median(times),
+        'min_ms': min(times),
+        'max_ms': max(times),
+        'queries': statistics.median(queries),
+    }
+
+
+def report(results, previous=None):
+    print(f"\n{'scenario':<26}{'median ms':>12}{'min ms':>10}{'queries':>10}")
+    for name, result in results.items():
+        line = f"{name:<26}{result['median_ms']:>12.1f}{result['min_ms']:>10.1f}{result['queries']:>10.0f}"
+        old = (previous or {}).get(name)
+        if old:
+            change = (result['median_ms'] - old['median_ms']) / old['median_ms'] * 100 if old['median_ms'] else 0
+            line += f"   {change:+.0f}% time, {result['queries'] - old['queries']:+.0f} queries"
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the main views against seeded data")
+    parser.add_argument('--buildings', type=int, default=4)
+    parser.add_argument('--sections', type=int, default=3, help="per building")
+    parser.add_argument('--rooms', type=int, default=200)
+    parser.add_argument('--events', type=int, default=6000)
+    parser.add_argument('--repeats', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', help="run just the scenarios whose name contains this")
+    parser.add_argument('--save', help="write the results to this JSON file")
+    parser.add_argument('--compare', help="JSON file from an earlier --save to compare against")
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        started = time.perf_counter()
+        data = generate(args.buildings, args.sections, args.rooms, args.events, args.seed)
+        print(f"Seeded {Room.objects.count()} rooms, {Person.objects.count()} people and "
+              f"{CustomEvent.objects.count()} events in {time.perf_counter() - started:.1f}s")
+
+        rng = random.Random(args.seed)
+        results = {}
+        for scenario in scenarios(data, rng):
+            if args.only and args.only not in scenario.name:
+                continue
+            results[scenario.name] = run(scenario, args.repeats)
+
+        previous = None
+        if args.compare:
+            with open(args.compare) as f:
+                previous = json.load(f)['results']
+        report(results, previous)
+
+        if args.save:
+            with open(args.save, 'w') as f:
+                json.dump({'settings': vars(args), 'results': results}, f, indent=2, default=str)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
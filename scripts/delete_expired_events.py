@@ -11,18 +11,13 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'RoomAss.settings')
 # Initialize Django
 django.setup()
 
-from django.utils.timezone import now
-from catalog.models import CustomEvent
+from catalog.expiry import delete_ended_events
 
 
-
-def delete_ended_events():
-    current_time = now()
-    print(current_time)
-    targets = CustomEvent.objects.filter(end__lt=current_time)
-    print(f"Deleted {targets.count()} expired event(s).")
-
-    targets.delete()
-
+# Same sweep the celery task runs (catalog/expiry.py), all the way through, printing as it goes
 if __name__ == "__main__":
-    delete_ended_events()
\ No newline at end of file
+    report = delete_ended_events(
+        progress=lambda report: print(f"Deleted {report['deleted']} expired event(s) so far (up to pk {report['last_pk']})"),
+    )
+    print(f"Deleted {report['deleted']} expired event(s) ended before {report['cutoff']} in {report['batches']} batch(es), "
+          f"{report['archived']} booking(s) archived.")
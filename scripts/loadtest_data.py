@@ -0,0 +1,141 @@
+import random
+from datetime import datetime, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from catalog.calendars import create_rooms
+from catalog.models import Building, CustomEvent, Person, Room, Section
+from catalog.room_days import refresh_room_days
+from catalog.utils import bulk_create_custom_events
+
+
+# Seeded, realistic looking data for load tests and benchmarks (see benchmark_views.py)
+# N buildings x M sections, R rooms spread across them, about E events
+#
+# roughly how the real place looks:
+#   - most rooms have an owner, the rest are guest rooms with a permanent availability
+#   - every owner has an account, some have children (people without accounts) who own rooms too
+#   - some members have no room at all
+#   - owners mostly let anyone stay, fewer want known guests or members only
+#   - owners post stretches of availability over the next few months, bookings land inside them
+#
+# Only ever point this at a throwaway database, it doesn't clean up after itself
+
+PASSWORD = "loadtest"
+
+OWNED_ROOMS = 0.75
+CHILD_OWNED_ROOMS = 0.1
+ROOMLESS_MEMBERS = 0.1
+PREFERENCES = [
+    (Person.Preference.ANYONE, 0.55),
+    (Person.Preference.KNOWN, 0.3),
+    (Person.Preference.MEMBERS, 0.15),
+]
+GUEST_TYPES = [
+    (CustomEvent.GuestType.STRANGER, 0.3),
+    (CustomEvent.GuestType.KNOWN, 0.5),
+    (CustomEvent.GuestType.MEMBER, 0.2),
+]
+
+
+def weighted(rng, choices):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights=weights)[0]
+
+
+# the views' check in / check out times, 12:01 and 11:59
+def at(day, hour, minute):
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()).replace(hour=hour, minute=minute))
+
+
+# Returns a dict of handles the benchmarks want: users, rooms, the superuser and so on
+def generate(buildings=4, sections=3, rooms=200, events=6000, seed=0):
+    rng = random.Random(seed)
+    password = make_password(PASSWORD)
+
+    building_list = Building.objects.bulk_create([
+        Building(name=f"Building {i}", area="courtyard" if i % 2 == 0 else "not_courtyard")
+        for i in range(buildings)
+    ])
+    section_list = Section.objects.bulk_create([
+        Section(building=building, name=f"Section {j}")
+        for building in building_list
+        for j in range(sections)
+    ])
+
+    # members with accounts, enough to own the rooms and a few over
+    owned = int(rooms * OWNED_ROOMS)
+    child_owned = int(owned * CHILD_OWNED_ROOMS)
+    member_count = owned - child_owned + int(rooms * ROOMLESS_MEMBERS)
+    users = User.objects.bulk_create([
+        User(username=f"member{i}", first_name=f"Member{i}", password=password)
+        for i in range(member_count)
+    ])
+    members = Person.objects.bulk_create([
+        Person(name=f"Member {i}", user=user, preference=weighted(rng, PREFERENCES))
+        for i, user in enumerate(users)
+    ])
+    parents = rng.sample(members[:owned - child_owned], min(child_owned, owned - child_owned))
+    children = Person.objects.bulk_create([
+        Person(name=f"Child {i}", parent=parent, preference=parent.preference)
+        for i, parent in enumerate(parents)
+    ])
+    owners = members[:owned - child_owned] + children
+    rng.shuffle(owners)
+
+    room_list = []
+    for i in range(rooms):
+        room_list.append(Room(
+            section=section_list[i % len(section_list)],
+            number=i // len(section_list) + 1,
+            owner=owners[i] if i < len(owners) else None,
+        ))
+    rng.shuffle(room_list)
+    room_list = create_rooms(room_list)
+
+    today = timezone.localdate()
+    hosts = users[:max(1, len(users) // 3)]
+    per_room = max(2, events // max(1, rooms))
+    event_list = []
+    for room in room_list:
+        event_list.extend(room_events(rng, room, today, per_room, hosts))
+    bulk_create_custom_events(event_list)
+    refresh_room_days()
+
+    return {
+        'superuser': User.objects.create_superuser(username="loadtest-admin", password=PASSWORD),
+        'users': users,
+        'rooms': room_list,
+        'sections': section_list,
+        'parents': parents,
+    }
+
+
+# Stretches of availability (for owned rooms) with bookings inside, from a few weeks ago to a few months out
+# ownerless rooms already have their permanent availability, they just get bookings
+def room_events(rng, room, today, count, hosts):
+    events = []
+    day = today - timedelta(days=rng.randint(0, 30))
+    while len(events) < count and day < today + timedelta(days=150):
+        length = rng.randint(5, 25)
+        end = day + timedelta(days=length)
+        if room.owner_id:
+            events.append(CustomEvent(calendar_id=room.calendar_id, event_type='availability', start=at(day, 12, 1), end=at(end, 11, 59), title="Availability"))
+
+        booking_day = day + timedelta(days=rng.randint(0, 3))
+        while len(events) < count and booking_day + timedelta(days=1) < end:
+            nights = rng.randint(1, 5)
+            booking_end = min(end, booking_day + timedelta(days=nights))
+            host = rng.choice(hosts)
+            guest_name = f"Guest {rng.randint(1, 10000)}"
+            events.append(CustomEvent(
+                calendar_id=room.calendar_id, event_type='occupancy',
+                start=at(booking_day, 12, 1), end=at(booking_end, 11, 59),
+                title=f"Booking: {guest_name} hosted by {host.username}",
+                creator=host, guest_name=guest_name, guest_type=weighted(rng, GUEST_TYPES),
+            ))
+            booking_day = booking_end + timedelta(days=rng.randint(1, 6))
+        day = end + timedelta(days=rng.randint(1, 10))
+    return events